@@ -1,30 +1,193 @@
-from fastapi import FastAPI
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
+import asyncio
+import time
+from contextlib import asynccontextmanager, suppress
+
+import httpx
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pathlib import Path
-from .providers.weather_nws import get_weather_payload
-from .providers.transit_sdmts import get_vehicle_positions
+from typing import Any, Dict, Hashable, List, Optional
+from . import metrics
+from .providers import gtfs_static, map_tiles, transit_sdmts, weather_nws
+from .providers.breaker import CircuitOpenError
+from .providers.weather_nws import (
+    HOURLY_DEFAULT_HOURS,
+    WeatherUnavailable,
+    cities_key,
+    get_hourly_payload,
+    get_weather_payload,
+    select_cities,
+    weather_changes,
+)
+from .providers.spatial import BBox, check_point, parse_bbox
+from .providers.transit_sdmts import get_nearby_vehicles, get_vehicle_positions, get_vehicle_trails
+from .responses import EncodedPayload, PayloadCache, encode_payload, etag_matches, payload_response
+from .static_assets import StaticBundle
+from .stream import event_stream
 
 BASE_DIR = Path(__file__).resolve().parents[2]  # repo root
 FRONTEND_DIR = BASE_DIR / "frontend"
 
-app = FastAPI(title="Pi Dashboard")
+# Serialized API responses, rebuilt only when the underlying data changes
+weather_payloads = PayloadCache("weather", max_entries=16)
+hourly_payloads = PayloadCache("hourly", max_entries=32)
+transit_payloads = PayloadCache("transit")
+
+# Browsers may reuse a map tile this long before asking again (and get a 304)
+TILE_CACHE_CONTROL = "public, max-age=86400"
+
+
+def _bbox_param(bbox: Optional[str]) -> Optional[BBox]:
+    if bbox is None:
+        return None
+    try:
+        return parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid bbox: {e}")
+
+
+def _store_unless_stale(cache: PayloadCache, generation: Hashable, key: Hashable, data: Dict[str, Any]) -> EncodedPayload:
+    # A stale (or failing) payload's age keeps growing while its data version stands still,
+    # so it is encoded per request instead of being frozen under the current generation.
+    if data.get("stale") or data.get("error"):
+        return encode_payload(data)
+    return cache.store(generation, key, data)
+
+
+def _cities_param(cities: Optional[str], profile: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+    if cities is None and profile is None:
+        return None
+    try:
+        return select_cities(cities, profile)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown profile: {profile}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cities: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Route names, colors and stops for vehicles, if a GTFS index has been ingested
+    gtfs_static.refresh()
+    tasks = [
+        asyncio.create_task(weather_nws.run_refresher()),
+        asyncio.create_task(transit_sdmts.run_poller()),
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        with suppress(asyncio.CancelledError):
+            await task
+    await weather_nws.aclose()
+    await map_tiles.aclose()
 
-# Serve static frontend files
-app.mount("/static", StaticFiles(directory=str(FRONTEND_DIR)), name="static")
+
+app = FastAPI(title="Pi Dashboard", lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Serve static frontend files (content-hashed, precompressed)
+assets = StaticBundle(FRONTEND_DIR)
 
 @app.get("/")
-def index():
-    return FileResponse(str(FRONTEND_DIR / "index.html"))
+def index(request: Request):
+    return assets.response(request, "index.html")
+
+@app.get("/static/{name:path}")
+def static(request: Request, name: str):
+    return assets.response(request, name)
+
+@app.get("/tiles/{z}/{x}/{y}.png")
+async def map_tile(request: Request, z: int, x: int, y: int):
+    if not map_tiles.valid_tile(z, x, y):
+        raise HTTPException(status_code=404, detail="No such tile")
+    try:
+        tile = await map_tiles.get_tile(z, x, y)
+    except (CircuitOpenError, httpx.HTTPError) as e:
+        raise HTTPException(status_code=502, detail=f"Tile unavailable: {e}")
+    headers = {"ETag": tile.etag, "Cache-Control": TILE_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), tile.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(tile.data, media_type="image/png", headers=headers)
 
 @app.get("/api/health")
 def health():
     return {"ok": True}
 
+@app.get("/api/metrics")
+def metrics_text():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/api/weather")
-def weather():
-    return get_weather_payload()
+async def weather(request: Request, cities: Optional[str] = None, profile: Optional[str] = None):
+    selected = _cities_param(cities, profile)
+    key = cities_key(selected)
+    # Read the version before building: a refresh landing mid-build just means one more rebuild.
+    version = weather_changes.version
+    encoded = weather_payloads.lookup(version, key)
+    if encoded is None:
+        try:
+            data = await get_weather_payload(selected)
+        except WeatherUnavailable as e:
+            raise HTTPException(status_code=503, detail=f"Weather unavailable: {e}", headers={"Retry-After": "30"})
+        encoded = _store_unless_stale(weather_payloads, version, key, data)
+    return payload_response(request, encoded)
+
+@app.get("/api/weather/hourly")
+async def weather_hourly(
+    request: Request,
+    hours: int = HOURLY_DEFAULT_HOURS,
+    step: int = 1,
+    cities: Optional[str] = None,
+    profile: Optional[str] = None,
+):
+    selected = _cities_param(cities, profile)
+    key = (cities_key(selected), hours, step)
+    # The window starts at the current hour, so the hour is part of the generation too.
+    generation = (weather_changes.version, int(time.time()) // 3600)
+    encoded = hourly_payloads.lookup(generation, key)
+    if encoded is None:
+        try:
+            data = await get_hourly_payload(selected, hours, step)
+        except WeatherUnavailable as e:
+            raise HTTPException(status_code=503, detail=f"Weather unavailable: {e}", headers={"Retry-After": "30"})
+        encoded = _store_unless_stale(hourly_payloads, generation, key, data)
+    return payload_response(request, encoded)
 
 @app.get("/api/transit/vehicles")
-def transit_vehicles():
-    return get_vehicle_positions()
\ No newline at end of file
+async def transit_vehicles(request: Request, since: Optional[int] = None, bbox: Optional[str] = None):
+    box = _bbox_param(bbox)
+    snap = transit_sdmts.current_snapshot()
+    # Staleness is part of the generation: if the poller stops publishing, the cached
+    # fresh body is dropped once the snapshot goes stale.
+    generation = (snap.version, snap.fetched_at, snap.error, transit_sdmts.snapshot_stale(snap))
+    encoded = transit_payloads.lookup(generation, (since, box))
+    if encoded is None:
+        encoded = _store_unless_stale(transit_payloads, generation, (since, box), get_vehicle_positions(since, box))
+    return payload_response(request, encoded)
+
+@app.get("/api/transit/trails")
+async def transit_trails(points: Optional[int] = None, at: Optional[float] = None, bbox: Optional[str] = None):
+    return get_vehicle_trails(points, at, _bbox_param(bbox))
+
+@app.get("/api/transit/nearby")
+async def transit_nearby(lat: float, lon: float, k: int = 5):
+    try:
+        check_point(lat, lon)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid point: {e}")
+    return get_nearby_vehicles(lat, lon, k)
+
+@app.get("/api/stream")
+async def stream(
+    request: Request,
+    bbox: Optional[str] = None,
+    cities: Optional[str] = None,
+    profile: Optional[str] = None,
+    last_event_id: Optional[str] = Header(default=None),
+):
+    return StreamingResponse(
+        event_stream(request, last_event_id, _bbox_param(bbox), _cities_param(cities, profile)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
\ No newline at end of file
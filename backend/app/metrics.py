@@ -0,0 +1,212 @@
+"""
+In-process metrics, rendered in the Prometheus text exposition format.
+
+Deliberately tiny: counters and histograms are dicts keyed by label values, and
+recording a sample is a lock plus a couple of dict/list updates. Everything is
+cumulative since process start; scrape /api/metrics and let the scraper do rates.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; upstream fetches and endpoint handling
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Bytes; upstream response bodies
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+Labels = Tuple[str, ...]
+
+REGISTRY: List["Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()     # the transit poller records from a worker thread
+        REGISTRY.append(self)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()])
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_label_text(self.labels, k)} {_number(v)}" for k, v in values]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][i] += 1
+            series[1][0] += value
+
+    def time(self, *labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((k, list(counts), total[0]) for k, (counts, total) in self._series.items())
+        out = []
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                out.append(f"{self.name}_bucket{_label_text(self.labels, labels, le)} {cumulative}")
+            out.append(f"{self.name}_sum{_label_text(self.labels, labels)} {_number(total)}")
+            out.append(f"{self.name}_count{_label_text(self.labels, labels)} {cumulative}")
+        return out
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: Labels) -> None:
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Gauge(Metric):
+    """A value read at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable[[], Optional[float]]) -> None:
+        super().__init__(name, help)
+        self.read = read
+
+    def samples(self) -> List[str]:
+        value = self.read()
+        return [] if value is None else [f"{self.name} {_number(value)}"]
+
+
+def render() -> str:
+    return "\n".join(m.render() for m in REGISTRY) + "\n"
+
+
+def _resident_bytes() -> Optional[float]:
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+_started = time.time()
+
+# Weather disk cache, per tier (points / forecast / hourly / gridpoint), and the map tile
+# store (tier "tiles"). A stale result is served immediately while a refresh runs behind it.
+cache_requests = Counter("peter_cache_requests_total", "Weather and map tile cache lookups by tier and result (hit, stale, miss).", ("tier", "result"))
+cache_disk_reads = Histogram("peter_cache_disk_read_seconds", "Time to read and parse a cache file that was not already in memory.", ("tier",))
+# Encoded API responses (see responses.PayloadCache)
+payload_cache_requests = Counter("peter_payload_cache_requests_total", "Encoded response cache lookups by cache and result (hit, miss).", ("cache", "result"))
+
+upstream_latency = Histogram("peter_upstream_request_seconds", "Upstream request latency until response headers.", ("upstream",))
+upstream_responses = Counter("peter_upstream_responses_total", "Upstream responses by status code ('error' for transport failures).", ("upstream", "status"))
+parse_duration = Histogram("peter_parse_seconds", "Time to decode and project an upstream body (includes body transfer for streamed feeds).", ("source",))
+payload_size = Histogram("peter_upstream_payload_bytes", "Upstream response body size on the wire.", ("source",), buckets=SIZE_BUCKETS)
+
+endpoint_latency = Histogram("peter_http_request_seconds", "Time until the response starts, by route.", ("route", "method"))
+endpoint_responses = Counter("peter_http_responses_total", "Responses by route and status code.", ("route", "method", "status"))
+
+Gauge("peter_process_resident_memory_bytes", "Resident set size of this process.", _resident_bytes)
+Gauge("peter_process_start_time_seconds", "Unix time the process started.", lambda: _started)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording endpoint latency and status. Latency stops at the
+    start of the response, so long-lived streams count their setup time only.
+    Requests that matched no route are grouped under "unmatched".
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        started = False
+
+        async def send_wrapper(message) -> None:
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+                self._record(scope, str(message["status"]), time.perf_counter() - start)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            if not started:
+                self._record(scope, "500", time.perf_counter() - start)
+            raise
+
+    @staticmethod
+    def _record(scope, status: str, elapsed: float) -> None:
+        route = getattr(scope.get("route"), "path", "unmatched")
+        method = scope.get("method", "")
+        endpoint_latency.observe(elapsed, route, method)
+        endpoint_responses.inc(route, method, status)
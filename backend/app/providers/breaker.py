@@ -0,0 +1,98 @@
+"""
+Per-host circuit breakers for upstream calls.
+
+After FAILURE_THRESHOLD consecutive failures a host's breaker opens and calls
+fail fast (CircuitOpenError) instead of waiting on a timeout. After a backoff
+(BASE_BACKOFF, with jitter) one probe call is let through; its success closes
+the breaker again, its failure reopens it for twice as long, up to MAX_BACKOFF.
+
+check() returns a token for the call it lets through, to be handed back to
+failure(). Failures of calls that were already in flight when the breaker
+opened belong to the burst that opened it and are not counted again.
+"""
+import random
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+FAILURE_THRESHOLD = 3
+BASE_BACKOFF = 5.0
+MAX_BACKOFF = 300.0
+# A probe that never reports back (e.g. its caller was cancelled) stops blocking others after this
+PROBE_TIMEOUT = 60.0
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a host whose breaker is open."""
+
+    def __init__(self, host: str, retry_in: float) -> None:
+        super().__init__(f"{host} is unavailable; retrying in {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(self, host: str) -> None:
+        self.host = host
+        self.failures = 0           # consecutive failures while closed
+        self.trips = 0              # failed probes since the breaker opened; doubles the backoff
+        self.opened_at: Optional[float] = None
+        self.open_until = 0.0
+        self._probe_until = 0.0
+        self._lock = threading.Lock()   # the transit poller calls from a worker thread
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def check(self) -> float:
+        """Raise CircuitOpenError unless a call may go ahead now. Returns the call's start token."""
+        with self._lock:
+            now = time.monotonic()
+            if not self.is_open:
+                return now
+            if now >= self.open_until and now >= self._probe_until:
+                # Half-open: one caller at a time probes the host.
+                self._probe_until = now + PROBE_TIMEOUT
+                return now
+            raise CircuitOpenError(self.host, max(0.0, self.open_until - now))
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.trips = 0
+            self.opened_at = None
+            self.open_until = 0.0
+            self._probe_until = 0.0
+
+    def failure(self, started: float) -> None:
+        """Record a failed call; `started` is the token check() returned for it."""
+        with self._lock:
+            if self.opened_at is not None and started < self.opened_at:
+                return          # in flight when the breaker opened
+            now = time.monotonic()
+            if self.is_open:
+                self.trips += 1
+            else:
+                self.failures += 1
+                if self.failures < FAILURE_THRESHOLD:
+                    return
+            backoff = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** min(self.trips, 16))
+            self.opened_at = now
+            self.open_until = now + backoff * random.uniform(0.8, 1.2)
+            self._probe_until = 0.0
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def breaker_for(url: str) -> CircuitBreaker:
+    host = urlsplit(url).netloc
+    with _registry_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker(host)
+        return breaker
+
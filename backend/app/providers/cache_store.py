@@ -0,0 +1,285 @@
+"""
+Storage backends for the NWS response cache.
+
+An entry is the dict weather_nws builds ({"_v", "_ts", "data", validators...});
+stores only persist and return it. Both keep an in-process memo of parsed entries
+and invalidate it cheaply (file mtime for JSON, PRAGMA data_version for SQLite),
+so a hot read never touches the disk.
+
+- SqliteStore (default): one WAL-mode database shared by every worker process.
+  Leases stop two workers from fetching the same key at once, and entries are
+  evicted least-recently-used once they go unused or the file outgrows its cap.
+- JsonFileStore: the original one-file-per-key layout. Single process only.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+from .. import metrics
+
+Entry = Dict[str, Any]
+
+DB_NAME = "nws_cache.sqlite3"
+# Bound on the stored payloads; least recently used entries go first
+MAX_BYTES = int(os.environ.get("PETER_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Entries nobody has read for this long are dropped (e.g. cities removed from CITIES)
+UNUSED_AFTER = 14 * 24 * 3600
+# Last-access times are written back at most this often per key, so reads stay read-only
+ACCESS_RESOLUTION = 600
+
+log = logging.getLogger(__name__)
+
+
+def cache_tier(key: str) -> str:
+    """nws_hourly_SGX_60_16 -> hourly"""
+    return key.split("_", 2)[1]
+
+
+def _dumps(entry: Entry) -> bytes:
+    return json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class JsonFileStore:
+    """One <key>.json per entry, replaced atomically on write."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        # key -> (file mtime_ns, parsed entry), so unchanged files are never re-read or re-parsed.
+        self._memo: Dict[str, Tuple[int, Entry]] = {}
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Entry]:
+        p = self._path(key)
+        try:
+            mtime = p.stat().st_mtime_ns
+        except OSError:
+            return None
+        memo = self._memo.get(key)
+        if memo and memo[0] == mtime:
+            return memo[1]
+        try:
+            with metrics.cache_disk_reads.time(cache_tier(key)):
+                entry = json.loads(p.read_bytes())
+        except Exception:
+            return None
+        self._memo[key] = (mtime, entry)
+        return entry
+
+    def put(self, key: str, entry: Entry) -> None:
+        p = self._path(key)
+        tmp = p.with_suffix(".json.tmp")
+        tmp.write_bytes(_dumps(entry))
+        tmp.replace(p)
+        self._memo[key] = (p.stat().st_mtime_ns, entry)
+
+    def acquire(self, key: str, seconds: float) -> bool:
+        return True
+
+    def release(self, key: str) -> None:
+        pass
+
+    def leased(self, key: str) -> bool:
+        return False
+
+    def evict(self) -> int:
+        return 0
+
+    def forget(self) -> None:
+        """Drop the in-process memo (the next read goes to disk)."""
+        self._memo.clear()
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteStore:
+    """
+    Entries in a single SQLite file, safe to share between worker processes.
+
+    Payloads are stored as compact JSON blobs. Reads are served from the memo
+    until another connection commits (PRAGMA data_version changes).
+    """
+
+    def __init__(self, path: Path, max_bytes: int = MAX_BYTES) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.owner = f"{os.getpid()}:{id(self)}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit; the few multi-statement updates open their own transactions.
+        self._db = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._memo: Dict[str, Entry] = {}
+        self._accessed: Dict[str, float] = {}
+        self._data_version: Optional[int] = None
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+                CREATE TABLE IF NOT EXISTS leases (
+                    key TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS meta (
+                    name TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                """
+            )
+
+    def _check_version(self) -> None:
+        # Changes whenever another connection commits; our own writes update the memo directly.
+        version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._data_version = version
+            self._memo.clear()
+
+    def get(self, key: str) -> Optional[Entry]:
+        with self._lock:
+            self._check_version()
+            entry = self._memo.get(key)
+            if entry is None:
+                row = self._db.execute("SELECT body FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                try:
+                    with metrics.cache_disk_reads.time(cache_tier(key)):
+                        entry = json.loads(row[0])
+                except ValueError:
+                    return None
+                self._memo[key] = entry
+            now = time.time()
+            if now - self._accessed.get(key, 0) >= ACCESS_RESOLUTION:
+                self._accessed[key] = now
+                self._db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            return entry
+
+    def put(self, key: str, entry: Entry) -> None:
+        body = _dumps(entry)
+        now = time.time()
+        with self._lock:
+            self._check_version()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, body, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, body, len(body), now),
+            )
+            # Our own commit bumps nothing for us, so the memo stays valid.
+            self._memo[key] = entry
+            self._accessed[key] = now
+
+    def acquire(self, key: str, seconds: float) -> bool:
+        """Take the fetch lease for key unless another live owner holds it."""
+        now = time.time()
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO leases (key, owner, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+                "WHERE leases.expires < ? OR leases.owner = excluded.owner",
+                (key, self.owner, now + seconds, now),
+            )
+            return cur.rowcount == 1
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner))
+
+    def leased(self, key: str) -> bool:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM leases WHERE key = ? AND expires >= ?", (key, time.time())
+            ).fetchone()
+            return row is not None
+
+    def evict(self) -> int:
+        """Drop unused entries, then the least recently used ones until under max_bytes."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                removed = self._db.execute("DELETE FROM entries WHERE accessed < ?", (now - UNUSED_AFTER,)).rowcount
+                total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+                if total > self.max_bytes:
+                    for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+                        if total <= self.max_bytes:
+                            break
+                        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                        total -= size
+                        removed += 1
+                self._db.execute("DELETE FROM leases WHERE expires < ?", (now,))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            if removed:
+                self._memo.clear()
+        return removed
+
+    def migrate_json(self, root: Path) -> int:
+        """
+        One-time import of a JsonFileStore directory. Recorded in the database,
+        so later starts (and other workers) skip it; the files are left in place.
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if self._db.execute("SELECT 1 FROM meta WHERE name = 'migrated_json'").fetchone():
+                    self._db.execute("COMMIT")
+                    return 0
+                count = 0
+                now = time.time()
+                for p in sorted(root.glob("nws_*.json")):
+                    try:
+                        body = _dumps(json.loads(p.read_bytes()))
+                    except (OSError, ValueError):
+                        continue
+                    self._db.execute(
+                        "INSERT OR IGNORE INTO entries (key, body, size, accessed) VALUES (?, ?, ?, ?)",
+                        (p.stem, body, len(body), now),
+                    )
+                    count += 1
+                self._db.execute("INSERT INTO meta (name, value) VALUES ('migrated_json', ?)", (str(now),))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        if count:
+            log.info("Imported %d cache files from %s into %s", count, root, self.path)
+        return count
+
+    def forget(self) -> None:
+        """Drop the in-process memo (the next read goes to the database)."""
+        with self._lock:
+            self._memo.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def open_store(root: Path, backend: str = "sqlite") -> Union[SqliteStore, JsonFileStore]:
+    """The configured store for the cache directory `root`."""
+    if backend == "json":
+        return JsonFileStore(root)
+    if backend != "sqlite":
+        raise ValueError(f"Unknown cache backend: {backend!r} (expected 'sqlite' or 'json')")
+    store = SqliteStore(root / DB_NAME)
+    store.migrate_json(root)
+    return store
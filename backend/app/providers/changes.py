@@ -0,0 +1,40 @@
+"""
+Change notification shared by the providers.
+A ChangeFeed is a version number that async code can wait on until it moves.
+"""
+import asyncio
+import time
+from typing import Iterable, Optional, Tuple
+
+
+class ChangeFeed:
+    def __init__(self, version: Optional[int] = None) -> None:
+        # Start from the process start time so versions never repeat across restarts.
+        self.version = version if version is not None else int(time.time())
+        self._event = asyncio.Event()
+
+    def bump(self, version: Optional[int] = None) -> None:
+        """Record a change and wake everyone waiting on the previous version."""
+        self.version = version if version is not None else self.version + 1
+        event, self._event = self._event, asyncio.Event()
+        event.set()
+
+    async def wait(self, seen: Optional[int]) -> None:
+        """Return once the version differs from `seen` (immediately if it already does)."""
+        if self.version != seen:
+            return
+        await self._event.wait()
+
+
+async def wait_any(feeds: Iterable[Tuple[ChangeFeed, Optional[int]]], timeout: float) -> bool:
+    """
+    Wait until any (feed, seen version) pair has moved on.
+    Returns False if `timeout` passed with no change.
+    """
+    waiters = [asyncio.ensure_future(feed.wait(seen)) for feed, seen in feeds]
+    try:
+        done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        return bool(done)
+    finally:
+        for w in waiters:
+            w.cancel()
@@ -0,0 +1,264 @@
+"""
+Static GTFS data (routes, stops, trips) used to enrich realtime vehicles.
+
+The realtime feed only names a vehicle's route_id (sometimes only its trip_id).
+Run, from backend/:
+
+    python -m app.providers.gtfs_static path/to/google_transit.zip
+
+to read a GTFS static zip once and write cache/gtfs_index.sqlite3, a compact
+index of just the columns the dashboard uses. The app opens it read-only and
+memory-mapped: routes and stops (a few thousand rows) are loaded in a few
+milliseconds, stops into a GridIndex for nearest-stop queries, and trip -> route
+lookups go straight to the trips primary key. Rerunning the command replaces
+the file atomically; the poller notices and switches to the new index.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from .spatial import GridIndex
+
+CACHE_DIR = Path(os.environ.get("PETER_CACHE_DIR", Path(__file__).resolve().parents[3] / "cache"))
+INDEX_PATH = Path(os.environ.get("SDMTS_GTFS_INDEX", CACHE_DIR / "gtfs_index.sqlite3"))
+# A vehicle farther than this from every stop has no nearest stop
+NEAREST_STOP_MAX_M = 400.0
+# Lookups remembered per index: a service day uses a few thousand trips, and vehicles
+# waiting at stops or layovers report the same position poll after poll
+TRIP_MEMO = 5000
+STOP_MEMO = 5000
+# GTFS route_type values for tram / light rail (basic and extended types)
+TRAM_ROUTE_TYPES = frozenset({0, *range(900, 907)})
+
+_LINE_NAME = re.compile(r"\b([A-Z][a-z]+) Line\b")
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Route:
+    route_id: str
+    short_name: str
+    long_name: str
+    color: Optional[str]        # "#RRGGBB"
+    route_type: int
+
+    @property
+    def name(self) -> str:
+        return self.long_name or self.short_name or self.route_id
+
+    @property
+    def is_tram(self) -> bool:
+        return self.route_type in TRAM_ROUTE_TYPES
+
+    @property
+    def line(self) -> Optional[str]:
+        """The line's name ("Blue" for "Blue Line"), or None if the route is not named that way."""
+        m = _LINE_NAME.search(self.long_name) or _LINE_NAME.search(self.short_name)
+        return m.group(1) if m else None
+
+
+@dataclass(frozen=True)
+class Stop:
+    stop_id: str
+    name: str
+
+
+class StaticIndex:
+    """A read-only view of one ingested feed."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._db.execute("PRAGMA mmap_size = 67108864")
+        self._lock = threading.Lock()
+        self._trips: Dict[str, Optional[str]] = {}
+        self._nearest: Dict[Tuple[float, float], Optional[Tuple[float, Stop]]] = {}
+        self.routes: Dict[str, Route] = {
+            row[0]: Route(*row)
+            for row in self._db.execute("SELECT route_id, short_name, long_name, color, route_type FROM routes")
+        }
+        self.stops: GridIndex[Stop] = GridIndex(
+            (lat, lon, Stop(stop_id, name))
+            for stop_id, name, lat, lon in self._db.execute("SELECT stop_id, name, lat, lon FROM stops")
+        )
+        self.meta = dict(self._db.execute("SELECT name, value FROM meta"))
+
+    def route(self, route_id: Optional[str]) -> Optional[Route]:
+        return self.routes.get(route_id) if route_id is not None else None
+
+    def route_for_trip(self, trip_id: str) -> Optional[str]:
+        with self._lock:
+            if trip_id in self._trips:
+                return self._trips[trip_id]
+            try:
+                row = self._db.execute("SELECT route_id FROM trips WHERE trip_id = ?", (trip_id,)).fetchone()
+            except sqlite3.ProgrammingError:
+                return None     # closed by refresh() while a parse still held this index
+            if len(self._trips) >= TRIP_MEMO:
+                self._trips.clear()
+            route_id = self._trips[trip_id] = row[0] if row else None
+            return route_id
+
+    def nearest_stop(self, lat: float, lon: float) -> Optional[Tuple[float, Stop]]:
+        """(distance in meters, stop) for the closest stop within NEAREST_STOP_MAX_M."""
+        key = (lat, lon)
+        if key in self._nearest:
+            return self._nearest[key]
+        found = self.stops.nearest(lat, lon, 1, NEAREST_STOP_MAX_M)
+        if len(self._nearest) >= STOP_MEMO:
+            self._nearest.clear()
+        stop = self._nearest[key] = found[0] if found else None
+        return stop
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+_index: Optional[StaticIndex] = None
+_index_mtime: Optional[int] = None
+
+
+def current() -> Optional[StaticIndex]:
+    """The loaded index, or None if none has been ingested."""
+    return _index
+
+
+def refresh() -> Optional[StaticIndex]:
+    """Load the index, or reload it if the file was replaced since (one stat otherwise)."""
+    global _index, _index_mtime
+    try:
+        mtime = INDEX_PATH.stat().st_mtime_ns
+    except OSError:
+        mtime = None
+    if mtime == _index_mtime:
+        return _index
+    _index_mtime = mtime
+    old, _index = _index, None
+    if mtime is not None:
+        start = time.perf_counter()
+        try:
+            _index = StaticIndex(INDEX_PATH)
+        except sqlite3.Error as e:
+            log.warning("Could not open GTFS index %s: %s", INDEX_PATH, e)
+        else:
+            log.info(
+                "Loaded GTFS index %s (%d routes, %d stops) in %.1f ms",
+                INDEX_PATH, len(_index.routes), len(_index.stops), (time.perf_counter() - start) * 1000,
+            )
+    if old is not None:
+        # Only after the swap: a parse still holding the old index sees it closed, not half-replaced
+        old.close()
+    return _index
+
+
+# -----------------------------
+# Ingestion
+# -----------------------------
+def _rows(feed: zipfile.ZipFile, name: str) -> Iterator[Dict[str, str]]:
+    try:
+        raw = feed.open(name)
+    except KeyError:
+        raise ValueError(f"GTFS feed has no {name}") from None
+    with raw, io.TextIOWrapper(raw, encoding="utf-8-sig", newline="") as text:
+        for row in csv.DictReader(text):
+            yield {k.strip(): (v or "").strip() for k, v in row.items() if k}
+
+
+def _color(value: str) -> Optional[str]:
+    return f"#{value.upper()}" if re.fullmatch(r"[0-9A-Fa-f]{6}", value) else None
+
+
+def ingest(zip_path: Path, out_path: Path = INDEX_PATH) -> Dict[str, int]:
+    """Build the index for a GTFS zip at out_path, replacing any previous one. Returns row counts."""
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+    db = sqlite3.connect(tmp)
+    try:
+        db.executescript(
+            """
+            CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID;
+            CREATE TABLE routes (
+                route_id TEXT PRIMARY KEY,
+                short_name TEXT NOT NULL,
+                long_name TEXT NOT NULL,
+                color TEXT,
+                route_type INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE stops (
+                stop_id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                lat REAL NOT NULL,
+                lon REAL NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE trips (trip_id TEXT PRIMARY KEY, route_id TEXT NOT NULL) WITHOUT ROWID;
+            """
+        )
+        with zipfile.ZipFile(zip_path) as feed, db:
+            db.executemany(
+                "INSERT OR REPLACE INTO routes VALUES (?, ?, ?, ?, ?)",
+                (
+                    (r["route_id"], r.get("route_short_name", ""), r.get("route_long_name", ""),
+                     _color(r.get("route_color", "")), int(r.get("route_type") or 3))
+                    for r in _rows(feed, "routes.txt")
+                ),
+            )
+            # Boarding locations only: stations, entrances and nodes (location_type 1-4) are skipped.
+            db.executemany(
+                "INSERT OR REPLACE INTO stops VALUES (?, ?, ?, ?)",
+                (
+                    (r["stop_id"], r.get("stop_name", ""), float(r["stop_lat"]), float(r["stop_lon"]))
+                    for r in _rows(feed, "stops.txt")
+                    if r.get("location_type", "") in ("", "0") and r.get("stop_lat") and r.get("stop_lon")
+                ),
+            )
+            db.executemany(
+                "INSERT OR REPLACE INTO trips VALUES (?, ?)",
+                ((r["trip_id"], r["route_id"]) for r in _rows(feed, "trips.txt")),
+            )
+            version = ""
+            if "feed_info.txt" in feed.namelist():
+                version = next(_rows(feed, "feed_info.txt"), {}).get("feed_version", "")
+            counts = {t: db.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("routes", "stops", "trips")}
+            db.executemany(
+                "INSERT INTO meta VALUES (?, ?)",
+                [("source", Path(zip_path).name), ("feed_version", version), ("ingested_at", str(int(time.time())))],
+            )
+        db.execute("VACUUM")
+    finally:
+        db.close()
+    os.replace(tmp, out_path)
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the static GTFS index the transit provider reads.")
+    parser.add_argument("feed", type=Path, help="GTFS static zip (e.g. google_transit.zip)")
+    parser.add_argument("--out", type=Path, default=INDEX_PATH, help=f"index to write (default {INDEX_PATH})")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = ingest(args.feed, args.out)
+    size = args.out.stat().st_size
+    print(
+        f"{counts['routes']} routes, {counts['stops']} stops, {counts['trips']} trips -> "
+        f"{args.out} ({size / 1024:.0f} KiB) in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
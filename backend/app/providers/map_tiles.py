@@ -0,0 +1,400 @@
+"""
+Map tile proxy for the transit map.
+
+The frontend loads its basemap from /tiles/{z}/{x}/{y}.png. Each tile is fetched
+from CARTO once and kept in an MBTiles file (cache/map_tiles.mbtiles), so a page
+reload costs no upstream traffic and the map keeps working offline:
+
+- A stored tile is always served straight from the file. Past TILE_TTL it is
+  revalidated upstream behind the response (If-None-Match), never in front of it.
+- Once the file outgrows MAX_BYTES, the least recently used tiles are evicted down to
+  EVICT_TO of it, so a full store pays for the scan once per batch of new tiles, not per tile.
+- `python -m app.providers.map_tiles` (from backend/) seeds every tile covering
+  TRANSIT_BOUNDS at the map's zoom levels, so a fresh install can start offline.
+
+The tiles table follows the MBTiles layout (TMS row order), with extra columns
+for the validator and the fetch/access times, so the file opens in MBTiles tools.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import httpx
+
+from .. import metrics
+from .breaker import CircuitOpenError, breaker_for
+from .cache_store import ACCESS_RESOLUTION
+
+TILE_URL = os.environ.get("MAP_TILE_URL", "https://{s}.basemaps.cartocdn.com/rastertiles/voyager/{z}/{x}/{y}.png")
+SUBDOMAINS = "abcd"
+ATTRIBUTION = "© OpenStreetMap contributors © CARTO"
+
+CACHE_DIR = Path(os.environ.get("PETER_CACHE_DIR", Path(__file__).resolve().parents[3] / "cache"))
+DB_NAME = "map_tiles.mbtiles"
+# Bound on stored tile data; least recently used tiles go first
+MAX_BYTES = int(os.environ.get("MAP_TILE_MAX_BYTES", str(128 * 1024 * 1024)))
+# Eviction frees space down to this fraction of MAX_BYTES (the low-water mark)
+EVICT_TO = 0.9
+# Stored tiles older than this are revalidated in the background
+TILE_TTL = 7 * 24 * 3600
+MAX_ZOOM = 19
+
+# The transit map's extent (keep in sync with TRANSIT_BOUNDS in frontend/app.js) and the
+# tile zooms Leaflet requests for its 11.4-14.5 zoom range (it rounds to whole levels).
+TRANSIT_BOUNDS = ((32.705, -117.22), (32.905, -116.99))
+PREFETCH_ZOOMS = range(11, 16)
+
+REQUEST_TIMEOUT = 15
+MAX_CONCURRENCY = 4
+HEADERS = {"User-Agent": "PETER-dashboard (Everett Richards, contact: local-kiosk)"}
+
+TileKey = Tuple[int, int, int]
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Tile:
+    data: bytes
+    etag: str
+    fetched: float
+
+
+class TileStore:
+    """
+    Tiles in one SQLite file, shared by the server and the prefetch command.
+
+    Every method blocks on SQLite; async callers run them with asyncio.to_thread.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = MAX_BYTES) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._accessed: Dict[TileKey, float] = {}
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS metadata (
+                    name TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                CREATE TABLE IF NOT EXISTS tiles (
+                    zoom_level INTEGER NOT NULL,
+                    tile_column INTEGER NOT NULL,
+                    tile_row INTEGER NOT NULL,
+                    tile_data BLOB NOT NULL,
+                    etag TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    fetched REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    PRIMARY KEY (zoom_level, tile_column, tile_row)
+                );
+                CREATE INDEX IF NOT EXISTS tiles_accessed ON tiles (accessed);
+                """
+            )
+            (south, west), (north, east) = TRANSIT_BOUNDS
+            self._db.executemany(
+                "INSERT OR IGNORE INTO metadata (name, value) VALUES (?, ?)",
+                [
+                    ("name", "PETER basemap"),
+                    ("format", "png"),
+                    ("bounds", f"{west},{south},{east},{north}"),
+                    ("minzoom", str(PREFETCH_ZOOMS.start)),
+                    ("maxzoom", str(PREFETCH_ZOOMS.stop - 1)),
+                    ("attribution", ATTRIBUTION),
+                ],
+            )
+            self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM tiles").fetchone()[0]
+
+    @staticmethod
+    def _row(z: int, y: int) -> int:
+        # MBTiles numbers rows from the south (TMS); the URL scheme numbers them from the north.
+        return (1 << z) - 1 - y
+
+    def get(self, z: int, x: int, y: int) -> Optional[Tile]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT tile_data, etag, fetched FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (z, x, self._row(z, y)),
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - self._accessed.get((z, x, y), 0) >= ACCESS_RESOLUTION:
+                self._accessed[(z, x, y)] = now
+                self._db.execute(
+                    "UPDATE tiles SET accessed = ? WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                    (now, z, x, self._row(z, y)),
+                )
+            return Tile(row[0], row[1], row[2])
+
+    def put(self, z: int, x: int, y: int, data: bytes, etag: str) -> Tile:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data, etag, size, fetched, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (z, x, self._row(z, y), data, etag, len(data), now, now),
+            )
+            self._accessed[(z, x, y)] = now
+            # Running estimate (ignores replaced tiles and other processes); evict() recounts.
+            self._total += len(data)
+            over = self._total > self.max_bytes
+        if over:
+            self.evict()
+        return Tile(data, etag, now)
+
+    def touch(self, z: int, x: int, y: int) -> None:
+        """Restart a tile's freshness clock (upstream answered 304)."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE tiles SET fetched = ? WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (time.time(), z, x, self._row(z, y)),
+            )
+
+    def evict(self) -> int:
+        """If the stored data exceeds max_bytes, drop the least recently used tiles down to EVICT_TO of it."""
+        victims: List[Tuple[int, int, int]] = []
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM tiles").fetchone()[0]
+                if total > self.max_bytes:
+                    target = int(self.max_bytes * EVICT_TO)
+                    # Walks the accessed index only as far as needed.
+                    oldest = self._db.execute(
+                        "SELECT zoom_level, tile_column, tile_row, size FROM tiles ORDER BY accessed"
+                    )
+                    for z, x, row, size in oldest:
+                        if total <= target:
+                            break
+                        victims.append((z, x, row))
+                        total -= size
+                    oldest.close()
+                    self._db.executemany(
+                        "DELETE FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?", victims
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._total = total
+            for z, x, row in victims:
+                self._accessed.pop((z, x, self._row(z, row)), None)
+        if victims:
+            log.info("Evicted %d map tiles from %s", len(victims), self.path)
+        return len(victims)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+_store: Optional[TileStore] = None
+_client: Optional[httpx.AsyncClient] = None
+_limiter: Optional[asyncio.Semaphore] = None
+# tile -> the one upstream fetch currently running for it (single-flight)
+_inflight: Dict[TileKey, "asyncio.Task[Tile]"] = {}
+
+
+def _get_store() -> TileStore:
+    global _store
+    if _store is None:
+        _store = TileStore(CACHE_DIR / DB_NAME)
+    return _store
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client, _limiter
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=MAX_CONCURRENCY, max_keepalive_connections=MAX_CONCURRENCY),
+        )
+        _limiter = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _client
+
+
+async def aclose() -> None:
+    """Close the HTTP client and the tile store (called on app shutdown)."""
+    global _client, _limiter, _store
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _limiter = None
+    if _store is not None:
+        _store.close()
+    _store = None
+
+
+def _tile_url(z: int, x: int, y: int) -> str:
+    return TILE_URL.format(s=SUBDOMAINS[(x + y) % len(SUBDOMAINS)], z=z, x=x, y=y)
+
+
+async def _fetch_tile(z: int, x: int, y: int, previous: Optional[Tile]) -> Tile:
+    client = _get_client()
+    assert _limiter is not None
+    url = _tile_url(z, x, y)
+    breaker = breaker_for(url)
+    try:
+        attempt = breaker.check()
+    except CircuitOpenError:
+        metrics.upstream_responses.inc("tiles", "circuit_open")
+        raise
+    headers = {"If-None-Match": previous.etag} if previous else {}
+    async with _limiter:
+        start = time.perf_counter()
+        try:
+            r = await client.get(url, headers=headers)
+        except httpx.HTTPError:
+            breaker.failure(attempt)
+            metrics.upstream_responses.inc("tiles", "error")
+            raise
+        finally:
+            metrics.upstream_latency.observe(time.perf_counter() - start, "tiles")
+    metrics.upstream_responses.inc("tiles", str(r.status_code))
+    if r.status_code >= 500 or r.status_code == 429:
+        breaker.failure(attempt)
+    else:
+        breaker.success()
+
+    store = _get_store()
+    if r.status_code == 304 and previous:
+        await asyncio.to_thread(store.touch, z, x, y)
+        return previous
+    r.raise_for_status()
+    metrics.payload_size.observe(len(r.content), "tiles")
+    etag = r.headers.get("etag") or '"' + hashlib.blake2b(r.content, digest_size=12).hexdigest() + '"'
+    return await asyncio.to_thread(store.put, z, x, y, r.content, etag)
+
+
+def _refresh(z: int, x: int, y: int, previous: Optional[Tile]) -> "asyncio.Task[Tile]":
+    """Start (or join) the upstream fetch for one tile."""
+    key = (z, x, y)
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_fetch_tile(z, x, y, previous))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _refresh_done(key, t))
+    return task
+
+
+def _refresh_done(key: TileKey, task: "asyncio.Task[Tile]") -> None:
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    if not task.cancelled() and task.exception() is not None:
+        e = task.exception()
+        (log.debug if isinstance(e, CircuitOpenError) else log.warning)("Map tile fetch failed for %s: %s", key, e)
+
+
+def valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= MAX_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)
+
+
+async def get_tile(z: int, x: int, y: int) -> Tile:
+    """
+    The tile at z/x/y, from the store when it has one (stale or not), else from upstream.
+    Raises httpx.HTTPError or CircuitOpenError if it has to be fetched and cannot be.
+    """
+    stored = await asyncio.to_thread(_get_store().get, z, x, y)
+    if stored is not None:
+        if time.time() - stored.fetched >= TILE_TTL:
+            metrics.cache_requests.inc("tiles", "stale")
+            _refresh(z, x, y, stored)
+        else:
+            metrics.cache_requests.inc("tiles", "hit")
+        return stored
+    metrics.cache_requests.inc("tiles", "miss")
+    # shield(): a browser dropping the request should not cancel a fetch others may share.
+    return await asyncio.shield(_refresh(z, x, y, None))
+
+
+# -----------------------------
+# Prefetch
+# -----------------------------
+def _tile_xy(lat: float, lon: float, z: int) -> Tuple[int, int]:
+    n = 1 << z
+    x = int((lon + 180.0) / 360.0 * n)
+    lat_r = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_r)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tiles_covering(bounds: Sequence[Sequence[float]], zooms: Sequence[int], pad: int = 0) -> Iterator[TileKey]:
+    """Every z/x/y tile overlapping ((south, west), (north, east)), plus `pad` tiles around it."""
+    (south, west), (north, east) = bounds
+    for z in zooms:
+        x0, y0 = _tile_xy(north, west, z)
+        x1, y1 = _tile_xy(south, east, z)
+        last = (1 << z) - 1
+        for x in range(max(0, x0 - pad), min(last, x1 + pad) + 1):
+            for y in range(max(0, y0 - pad), min(last, y1 + pad) + 1):
+                yield z, x, y
+
+
+async def prefetch(tiles: Sequence[TileKey], refresh: bool = False) -> Dict[str, int]:
+    """Fetch every tile the store lacks (all of them with refresh=True); counts by outcome."""
+    store = _get_store()
+    counts = {"fetched": 0, "stored": 0, "failed": 0}
+
+    async def one(z: int, x: int, y: int) -> None:
+        stored = await asyncio.to_thread(store.get, z, x, y)
+        if stored is not None and not refresh:
+            counts["stored"] += 1
+            return
+        try:
+            await _refresh(z, x, y, stored)
+        except (httpx.HTTPError, CircuitOpenError):
+            counts["failed"] += 1
+        else:
+            counts["fetched"] += 1
+
+    await asyncio.gather(*(one(*t) for t in tiles))
+    return counts
+
+
+def _zoom_range(text: str) -> range:
+    lo, _, hi = text.partition("-")
+    return range(int(lo), int(hi or lo) + 1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed the map tile store with every tile covering the transit map.")
+    parser.add_argument("--zoom", type=_zoom_range, default=PREFETCH_ZOOMS, help="zoom level or range, e.g. 11-15")
+    parser.add_argument("--pad", type=int, default=1, help="extra tiles around the bounds (the viewport overhangs them)")
+    parser.add_argument("--refresh", action="store_true", help="revalidate tiles that are already stored")
+    args = parser.parse_args()
+
+    tiles = list(tiles_covering(TRANSIT_BOUNDS, args.zoom, args.pad))
+    print(f"{len(tiles)} tiles at zoom {args.zoom.start}-{args.zoom.stop - 1} -> {CACHE_DIR / DB_NAME}")
+
+    async def run() -> Dict[str, int]:
+        try:
+            return await prefetch(tiles, args.refresh)
+        finally:
+            await aclose()
+
+    start = time.perf_counter()
+    counts = asyncio.run(run())
+    print(", ".join(f"{n} {k}" for k, n in counts.items()) + f" in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Raw NWS gridpoint data (/gridpoints/{wfo}/{x},{y}): the forecast layers that
+/forecast and /forecast/hourly are both generated from.
+
+Every layer is a list of {"validTime": "<start>/<ISO-8601 duration>", "value": ...}
+runs. project() lays the layers the dashboard uses out on one hourly grid, one
+slice assignment per run, converted to the units the forecast endpoints use
+(°F, mph, percent). hourly_rows() and forecast_periods() rebuild the hourly and
+day/night period lists from it, so one download per grid replaces two.
+
+NWS publishes no icons or wording for raw data. shortForecast and
+detailedForecast are composed from sky cover and the weather layer, and icon is None.
+"""
+from __future__ import annotations
+
+import re
+from collections import Counter
+from datetime import datetime, timedelta, timezone, tzinfo
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+HOUR = 3600
+# NWS gridpoints cover about 7.5 days; anything past this is dropped
+MAX_HOURS = 8 * 24
+
+# Layers kept from the raw response. Units are converted per the layer's "uom".
+LAYERS = (
+    "temperature", "apparentTemperature", "maxTemperature", "minTemperature",
+    "relativeHumidity", "probabilityOfPrecipitation", "skyCover",
+    "windSpeed", "windGust", "weather",
+)
+
+# Same names as the /forecast/hourly fields weather_nws keeps, plus layers that endpoint lacks
+HOURLY_FIELDS = (
+    "startTime", "temperature", "icon", "shortForecast", "probabilityOfPrecipitation",
+    "windSpeed", "isDaytime", "cloudCover", "apparentTemperature", "relativeHumidity", "windGust",
+)
+
+# Local hours at which NWS day and night forecast periods begin
+DAY_START = 6
+NIGHT_START = 18
+MAX_PERIODS = 14
+
+_DURATION = re.compile(r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?)?$")
+
+# Weather coverage terms, weakest to strongest; the strongest in a period names it
+_COVERAGE_RANK = {
+    "slight_chance": 1, "isolated": 1, "patchy": 1,
+    "chance": 2, "scattered": 2, "areas": 2,
+    "likely": 3, "numerous": 3, "occasional": 3,
+    "definite": 4, "widespread": 4, "frequent": 4, "": 4,
+}
+
+
+def _interval(valid_time: str, starts: Dict[str, int]) -> Tuple[int, int]:
+    """Split a validTime such as "2026-04-19T15:00:00+00:00/PT3H" into (epoch start, whole hours)."""
+    start_text, _, duration = valid_time.partition("/")
+    start = starts.get(start_text)
+    if start is None:
+        # Layers share run boundaries, so most starts repeat.
+        start = starts[start_text] = int(datetime.fromisoformat(start_text).timestamp())
+    m = _DURATION.match(duration)
+    if m is None:
+        raise ValueError(f"unsupported validTime duration: {duration!r}")
+    days, hours, minutes = (int(g or 0) for g in m.groups())
+    return start, days * 24 + hours + (minutes + 59) // 60
+
+
+def _converter(uom: Optional[str]) -> Callable[[float], int]:
+    unit = (uom or "").rpartition(":")[2]
+    if unit == "degC":
+        return lambda v: round(v * 9 / 5 + 32)
+    if unit == "km_h-1":
+        return lambda v: round(v / 1.609344)
+    if unit == "m_s-1":
+        return lambda v: round(v * 2.236936)
+    # degF, percent
+    return round
+
+
+def _weather_code(value: List[Dict[str, Any]]) -> Optional[str]:
+    """The strongest entry of a weather value as "coverage:weather", e.g. "chance:rain_showers"."""
+    best = None
+    for item in value or ():
+        kind = item.get("weather")
+        if not kind:
+            continue
+        coverage = item.get("coverage") or ""
+        if best is None or _COVERAGE_RANK.get(coverage, 0) > _COVERAGE_RANK.get(best[0], 0):
+            best = (coverage, kind)
+    return f"{best[0]}:{best[1]}" if best else None
+
+
+def project(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Raw gridpoint GeoJSON -> {"start": epoch of the first hour, "hours": n,
+    "series": {layer: [one value per hour, None where the layer has no data]}}.
+    """
+    props = data["properties"]
+    starts: Dict[str, int] = {}
+    start, hours = _interval(props["validTimes"], starts)
+    start -= start % HOUR
+    hours = min(hours, MAX_HOURS)
+
+    series: Dict[str, List[Any]] = {}
+    for name in LAYERS:
+        layer = props.get(name) or {}
+        convert = _weather_code if name == "weather" else _converter(layer.get("uom"))
+        values: List[Any] = [None] * hours
+        for run in layer.get("values", ()):
+            value = run.get("value")
+            if value is None:
+                continue
+            run_start, length = _interval(run["validTime"], starts)
+            a = (run_start - start) // HOUR
+            b = min(a + length, hours)
+            a = max(a, 0)
+            if a < b:
+                values[a:b] = [convert(value)] * (b - a)
+        series[name] = values
+    return {"start": start, "hours": hours, "series": series}
+
+
+@lru_cache(maxsize=None)
+def _zone(name: str) -> tzinfo:
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+
+def _is_daytime(t: datetime) -> bool:
+    return DAY_START <= t.hour < NIGHT_START
+
+
+def _present(values: Sequence[Any]) -> List[Any]:
+    return [v for v in values if v is not None]
+
+
+def _sky_words(sky: Optional[int], day: bool) -> str:
+    if sky is None:
+        return ""
+    if sky < 13:
+        return "Sunny" if day else "Clear"
+    if sky < 38:
+        return "Mostly Sunny" if day else "Mostly Clear"
+    if sky < 63:
+        return "Partly Sunny" if day else "Partly Cloudy"
+    if sky < 88:
+        return "Mostly Cloudy"
+    return "Cloudy"
+
+
+def _short_forecast(sky: Optional[int], weather: Optional[str], day: bool) -> str:
+    """NWS-style wording: "Chance Rain Showers", "Rain Likely", "Patchy Fog", "Mostly Sunny"."""
+    if not weather:
+        return _sky_words(sky, day)
+    coverage, _, kind = weather.partition(":")
+    words = kind.replace("_", " ").title()
+    if coverage == "likely":
+        return f"{words} Likely"
+    if coverage in ("", "definite"):
+        return words
+    return f"{coverage.replace('_', ' ').title()} {words}"
+
+
+def _dominant_weather(values: Sequence[Optional[str]]) -> Optional[str]:
+    counts = Counter(v for v in values if v)
+    if not counts:
+        return None
+    return max(counts, key=lambda w: (_COVERAGE_RANK.get(w.partition(":")[0], 0), counts[w]))
+
+
+def hourly_rows(data: Dict[str, Any], time_zone: str, now: float) -> Dict[str, Any]:
+    """Hourly periods from the current hour on, as {"fields": HOURLY_FIELDS, "rows": [...]}."""
+    tz = _zone(time_zone)
+    s = data["series"]
+    start = data["start"]
+    first = max(0, (int(now) - start) // HOUR)
+    rows = []
+    for i in range(first, data["hours"]):
+        temp = s["temperature"][i]
+        if temp is None:
+            continue
+        t = datetime.fromtimestamp(start + i * HOUR, tz)
+        day = _is_daytime(t)
+        sky = s["skyCover"][i]
+        wind = s["windSpeed"][i]
+        rows.append([
+            t.isoformat(), temp, None, _short_forecast(sky, s["weather"][i], day),
+            s["probabilityOfPrecipitation"][i], f"{wind} mph" if wind is not None else None,
+            day, sky, s["apparentTemperature"][i], s["relativeHumidity"][i], s["windGust"][i],
+        ])
+    return {"fields": list(HOURLY_FIELDS), "rows": rows}
+
+
+def _period_name(t: datetime, today: datetime, day: bool) -> str:
+    if day:
+        return "Today" if t.date() == today.date() else t.strftime("%A")
+    if t.hour < DAY_START:
+        return "Overnight"
+    return "Tonight" if t.date() == today.date() else t.strftime("%A Night")
+
+
+def _detailed_forecast(short: str, temp: Optional[int], pop: Optional[int], day: bool) -> str:
+    parts = [f"{short}."] if short else []
+    if temp is not None:
+        parts.append(f"High near {temp}." if day else f"Low around {temp}.")
+    if pop is not None and pop >= 20:
+        parts.append(f"Chance of precipitation is {pop}%.")
+    return " ".join(parts)
+
+
+def forecast_periods(data: Dict[str, Any], time_zone: str, now: float) -> List[Dict[str, Any]]:
+    """
+    Day (06-18 local) and night periods from the current one on, shaped like the
+    /forecast periods: day temperature is the high, night temperature the low, and
+    precipitation chance is the period's maximum.
+    """
+    tz = _zone(time_zone)
+    s = data["series"]
+    base = data["start"]
+    today = datetime.fromtimestamp(int(now) // HOUR * HOUR, tz)
+    t = today
+    periods: List[Dict[str, Any]] = []
+    while len(periods) < MAX_PERIODS:
+        day = _is_daytime(t)
+        end = t.replace(hour=NIGHT_START if day else DAY_START, minute=0, second=0)
+        if not day and t.hour >= NIGHT_START:
+            end += timedelta(days=1)
+        a = max(0, (int(t.timestamp()) - base) // HOUR)
+        b = min(data["hours"], (int(end.timestamp()) - base) // HOUR)
+        if a >= b:
+            break
+
+        temps = _present(s["maxTemperature" if day else "minTemperature"][a:b]) or _present(s["temperature"][a:b])
+        pops = _present(s["probabilityOfPrecipitation"][a:b])
+        skies = _present(s["skyCover"][a:b])
+        temp = (max if day else min)(temps) if temps else None
+        pop = max(pops) if pops else None
+        short = _short_forecast(round(sum(skies) / len(skies)) if skies else None, _dominant_weather(s["weather"][a:b]), day)
+        periods.append({
+            "name": _period_name(t, today, day),
+            "isDaytime": day,
+            "temperature": temp,
+            "icon": None,
+            "shortForecast": short,
+            "detailedForecast": _detailed_forecast(short, temp, pop, day),
+            "probabilityOfPrecipitation": pop,
+        })
+        t = end
+    return periods
@@ -0,0 +1,146 @@
+"""
+Uniform lat/lon grid index for point data (vehicle positions, stops).
+Cells are CELL_DEG on a side; bbox and k-nearest queries only visit the cells
+they overlap, so their cost follows the number of results, not the fleet size.
+"""
+import heapq
+import math
+from typing import Dict, Generic, Iterable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+CELL_DEG = 0.01                 # ~1.1 km north-south
+METERS_PER_DEG = 111_320.0
+
+BBox = Tuple[float, float, float, float]   # (min_lat, min_lon, max_lat, max_lon)
+
+
+def check_point(lat: float, lon: float) -> None:
+    """Raise ValueError unless lat/lon are finite and within [-90, 90] / [-180, 180]."""
+    if not (math.isfinite(lat) and math.isfinite(lon)):
+        raise ValueError("coordinates must be finite numbers")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("latitude must be within [-90, 90] and longitude within [-180, 180]")
+
+
+def parse_bbox(text: str) -> BBox:
+    """Parse "min_lat,min_lon,max_lat,max_lon". Raises ValueError on bad input."""
+    parts = [float(p) for p in text.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox must be min_lat,min_lon,max_lat,max_lon")
+    min_lat, min_lon, max_lat, max_lon = parts
+    check_point(min_lat, min_lon)
+    check_point(max_lat, max_lon)
+    if min_lat > max_lat or min_lon > max_lon:
+        raise ValueError("bbox minimums must not exceed maximums")
+    return min_lat, min_lon, max_lat, max_lon
+
+
+def distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    # Equirectangular approximation: plenty for city-scale distances and much cheaper than haversine.
+    x = (lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = lat2 - lat1
+    return math.hypot(x, y) * METERS_PER_DEG
+
+
+def _cell(lat: float, lon: float) -> Tuple[int, int]:
+    return math.floor(lat / CELL_DEG), math.floor(lon / CELL_DEG)
+
+
+class GridIndex(Generic[T]):
+    """Immutable once built; rebuild it when the underlying points change."""
+
+    def __init__(self, points: Iterable[Tuple[float, float, T]]) -> None:
+        self._cells: Dict[Tuple[int, int], List[Tuple[float, float, T]]] = {}
+        for lat, lon, item in points:
+            self._cells.setdefault(_cell(lat, lon), []).append((lat, lon, item))
+        if self._cells:
+            rows = [c[0] for c in self._cells]
+            cols = [c[1] for c in self._cells]
+            self._extent = (min(rows), min(cols), max(rows), max(cols))
+        else:
+            self._extent = None
+
+    def __len__(self) -> int:
+        return sum(len(items) for items in self._cells.values())
+
+    def bbox(self, box: BBox) -> List[T]:
+        min_lat, min_lon, max_lat, max_lon = box
+        r0, c0 = _cell(min_lat, min_lon)
+        r1, c1 = _cell(max_lat, max_lon)
+        out: List[T] = []
+        if (r1 - r0 + 1) * (c1 - c0 + 1) > len(self._cells):
+            # Huge box: walking the occupied cells is cheaper than walking the box.
+            cells = (items for (r, c), items in self._cells.items() if r0 <= r <= r1 and c0 <= c <= c1)
+        else:
+            cells = (self._cells.get((r, c)) for r in range(r0, r1 + 1) for c in range(c0, c1 + 1))
+        for items in cells:
+            if not items:
+                continue
+            for lat, lon, item in items:
+                if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+                    out.append(item)
+        return out
+
+    def nearest(self, lat: float, lon: float, k: int, max_distance_m: Optional[float] = None) -> List[Tuple[float, T]]:
+        """
+        The k closest items as (distance in meters, item), nearest first.
+        Searches rings of cells outward, starting at the first ring that reaches an
+        occupied cell, and stops once no unvisited cell can beat the kth result.
+        Once a ring would have more cells than are occupied, a scan of the
+        occupied cells is cheaper and finishes the search instead.
+        """
+        if k <= 0 or self._extent is None:
+            return []
+        r0, c0 = _cell(lat, lon)
+        min_r, min_c, max_r, max_c = self._extent
+        first_ring = max(min_r - r0, r0 - max_r, min_c - c0, c0 - max_c, 0)
+        max_ring = max(abs(r0 - min_r), abs(r0 - max_r), abs(c0 - min_c), abs(c0 - max_c))
+        # Any point outside ring n is at least n cells away along the narrower (east-west) cell side.
+        cell_m = CELL_DEG * METERS_PER_DEG * math.cos(math.radians(lat))
+        if max_distance_m is not None and first_ring > 0 and (first_ring - 1) * cell_m > max_distance_m:
+            return []
+
+        best: List[Tuple[float, int, T]] = []   # max-heap on distance via negation
+        seq = 0
+        for ring in range(first_ring, max_ring + 1):
+            if 8 * ring > len(self._cells):
+                return self._scan(lat, lon, k, max_distance_m)
+            for r, c in _ring_cells(r0, c0, ring):
+                for plat, plon, item in self._cells.get((r, c), ()):
+                    d = distance_m(lat, lon, plat, plon)
+                    if max_distance_m is not None and d > max_distance_m:
+                        continue
+                    seq += 1
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, seq, item))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, seq, item))
+            bound = ring * cell_m
+            if len(best) == k and -best[0][0] <= bound:
+                break
+            if max_distance_m is not None and bound > max_distance_m:
+                break
+        return [(-nd, item) for nd, _, item in sorted(best, key=lambda e: -e[0])]
+
+    def _scan(self, lat: float, lon: float, k: int, max_distance_m: Optional[float]) -> List[Tuple[float, T]]:
+        found = (
+            (distance_m(lat, lon, plat, plon), item)
+            for items in self._cells.values()
+            for plat, plon, item in items
+        )
+        if max_distance_m is not None:
+            found = (f for f in found if f[0] <= max_distance_m)
+        return heapq.nsmallest(k, found, key=lambda f: f[0])
+
+
+def _ring_cells(r0: int, c0: int, ring: int) -> Iterable[Tuple[int, int]]:
+    if ring == 0:
+        yield r0, c0
+        return
+    for c in range(c0 - ring, c0 + ring + 1):
+        yield r0 - ring, c
+        yield r0 + ring, c
+    for r in range(r0 - ring + 1, r0 + ring):
+        yield r, c0 - ring
+        yield r, c0 + ring
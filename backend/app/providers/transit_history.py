@@ -0,0 +1,161 @@
+"""
+Bounded per-vehicle position history for the transit map.
+
+All tracks live in a few preallocated flat arrays (MAX_TRACKS slots of
+TRACK_LENGTH points each), so memory is fixed at startup no matter how long
+the process runs or how many vehicles come and go. A vehicle that has not
+reported for INACTIVE_SECONDS gives its slot back.
+"""
+import math
+import os
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .spatial import METERS_PER_DEG
+
+TRACK_LENGTH = int(os.environ.get("SDMTS_TRACK_LENGTH", "20"))     # points kept per vehicle
+MAX_TRACKS = int(os.environ.get("SDMTS_MAX_TRACKS", "1500"))       # vehicles tracked at once
+INACTIVE_SECONDS = 10 * 60
+# Predictions never run further ahead of the last report than this
+MAX_EXTRAPOLATE_SECONDS = 45
+
+
+class TrackStore:
+    def __init__(self, slots: int = MAX_TRACKS, length: int = TRACK_LENGTH) -> None:
+        self.slots = slots
+        self.length = length
+        size = slots * length
+        # Point i of slot s lives at s * length + i (ring order, see _head)
+        self._lat = array("d", bytes(8 * size))
+        self._lon = array("d", bytes(8 * size))
+        self._ts = array("d", bytes(8 * size))
+        self._head = array("l", bytes(array("l").itemsize * slots))   # next write position
+        self._count = array("l", bytes(array("l").itemsize * slots))
+        self._last_seen = array("d", bytes(8 * slots))
+        self._slot_of: Dict[str, int] = {}
+        self._free: List[int] = list(range(slots - 1, -1, -1))
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def _claim(self, vehicle_id: str) -> int:
+        if not self._free:
+            # Full: recycle the slot of whichever vehicle was seen longest ago.
+            oldest = min(self._slot_of, key=lambda vid: self._last_seen[self._slot_of[vid]])
+            self._release(oldest)
+        slot = self._free.pop()
+        self._head[slot] = 0
+        self._count[slot] = 0
+        self._slot_of[vehicle_id] = slot
+        return slot
+
+    def _release(self, vehicle_id: str) -> None:
+        self._free.append(self._slot_of.pop(vehicle_id))
+
+    def record(self, vehicles: Iterable[Dict[str, Any]], now: float) -> None:
+        """
+        Append each vehicle's current report. A report is only stored if its
+        timestamp is newer than the last one kept, so an unchanged feed adds nothing.
+        """
+        n = self.length
+        for v in vehicles:
+            vid = v["id"]
+            ts = float(v.get("timestamp") or now)
+            slot = self._slot_of.get(vid)
+            if slot is None:
+                slot = self._claim(vid)
+            count = self._count[slot]
+            head = self._head[slot]
+            base = slot * n
+            if count and ts <= self._ts[base + (head - 1) % n]:
+                self._last_seen[slot] = now
+                continue
+            self._lat[base + head] = v["latitude"]
+            self._lon[base + head] = v["longitude"]
+            self._ts[base + head] = ts
+            self._head[slot] = (head + 1) % n
+            self._count[slot] = min(count + 1, n)
+            self._last_seen[slot] = now
+        self.evict(now)
+
+    def evict(self, now: float) -> None:
+        cutoff = now - INACTIVE_SECONDS
+        for vid in [vid for vid, slot in self._slot_of.items() if self._last_seen[slot] < cutoff]:
+            self._release(vid)
+
+    def trail(self, vehicle_id: str, points: Optional[int] = None) -> List[Tuple[float, float, float]]:
+        """The newest `points` reports as (lat, lon, ts), oldest first."""
+        slot = self._slot_of.get(vehicle_id)
+        if slot is None:
+            return []
+        n = self.length
+        count = self._count[slot]
+        take = count if points is None else max(0, min(points, count))
+        base = slot * n
+        head = self._head[slot]
+        out = []
+        for i in range(head - take, head):
+            j = base + i % n
+            out.append((self._lat[j], self._lon[j], self._ts[j]))
+        return out
+
+    def motion(self, vehicle_ids: Iterable[str], at: float) -> Dict[str, Dict[str, Any]]:
+        """
+        For each vehicle with at least two reports, in one pass over the arrays:
+        heading (degrees clockwise from north), speed (m/s) from the last two reports,
+        and its position at time `at`, interpolated between reports or extrapolated
+        from the last one (capped at MAX_EXTRAPOLATE_SECONDS).
+        """
+        n = self.length
+        lat_a, lon_a, ts_a = self._lat, self._lon, self._ts
+        out: Dict[str, Dict[str, Any]] = {}
+        for vid in vehicle_ids:
+            slot = self._slot_of.get(vid)
+            if slot is None or self._count[slot] < 2:
+                continue
+            base = slot * n
+            head = self._head[slot]
+            count = self._count[slot]
+            last = base + (head - 1) % n
+            prev = base + (head - 2) % n
+            dt = ts_a[last] - ts_a[prev]
+            if dt <= 0:
+                continue
+            cos_lat = math.cos(math.radians(lat_a[last]))
+            vlat = (lat_a[last] - lat_a[prev]) / dt
+            vlon = (lon_a[last] - lon_a[prev]) / dt
+            north = vlat * METERS_PER_DEG
+            east = vlon * METERS_PER_DEG * cos_lat
+
+            if at >= ts_a[last]:
+                ahead = min(at - ts_a[last], MAX_EXTRAPOLATE_SECONDS)
+                plat, plon = lat_a[last] + vlat * ahead, lon_a[last] + vlon * ahead
+            else:
+                plat, plon = _interpolate(lat_a, lon_a, ts_a, base, head, count, n, at)
+
+            out[vid] = {
+                "heading": round(math.degrees(math.atan2(east, north)) % 360, 1),
+                "speed_mps": round(math.hypot(north, east), 2),
+                "position": [round(plat, 6), round(plon, 6)],
+            }
+        return out
+
+
+def _interpolate(lat_a, lon_a, ts_a, base, head, count, n, at) -> Tuple[float, float]:
+    # Walk back from the newest report to the pair that brackets `at`.
+    newer = base + (head - 1) % n
+    for i in range(2, count + 1):
+        older = base + (head - i) % n
+        if ts_a[older] <= at:
+            span = ts_a[newer] - ts_a[older]
+            f = (at - ts_a[older]) / span if span > 0 else 0.0
+            return (
+                lat_a[older] + (lat_a[newer] - lat_a[older]) * f,
+                lon_a[older] + (lon_a[newer] - lon_a[older]) * f,
+            )
+        newer = older
+    # Before the oldest kept report: pin to it.
+    return lat_a[newer], lon_a[newer]
+
+
+vehicle_history = TrackStore()
@@ -3,28 +3,277 @@ Provider for San Diego MTS (SDMTS) real-time transit data.
 Fetches vehicle positions for buses and trolleys.
 """
 import requests
+import asyncio
+import codecs
+import logging
 import os
 import re
-from typing import List, Dict, Any
+import struct
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import List, Dict, Any, Iterable, Optional, Tuple, Union
 
-SDMTS_API_URL = "https://realtime.sdmts.com/api/api/gtfs_realtime/vehicle-positions-for-agency/MTS.pbtext"
+from .. import metrics
+from .breaker import CircuitOpenError, breaker_for
+from . import gtfs_static
+from .changes import ChangeFeed
+from .spatial import BBox, GridIndex
+from .transit_history import vehicle_history
+
+# Feed format: "pbtext" (human-readable text) or "protobuf" (binary GTFS-RT FeedMessage,
+# several times smaller on the wire; decoding it costs about the same CPU as parsing the text).
+SDMTS_FEED_FORMAT = os.environ.get("SDMTS_FEED_FORMAT", "pbtext").lower()
+SDMTS_API_BASE = os.environ.get(
+    "SDMTS_API_BASE",
+    "https://realtime.sdmts.com/api/api/gtfs_realtime/vehicle-positions-for-agency/MTS",
+)
+SDMTS_API_URL = f"{SDMTS_API_BASE}.{'pb' if SDMTS_FEED_FORMAT == 'protobuf' else 'pbtext'}"
 # API key should be stored in environment variable for production
 API_KEY = os.environ.get("SDMTS_API_KEY", "90662cf7-2951-4fd4-9cdd-7c9cedadb247")
 
-# Trolley route IDs (based on SDMTS system)
-TROLLEY_ROUTES = {"510", "520", "530", "532"}
+# Background poller: one upstream fetch per interval, shared by every client
+POLL_INTERVAL = float(os.environ.get("SDMTS_POLL_INTERVAL", "15"))
+# A snapshot older than this many poll intervals is reported as stale
+STALE_AFTER_POLLS = 3
+# How many past snapshot versions ?since= can diff against before falling back to a full list
+DELTA_HISTORY = 20
+# Upper bound for /api/transit/nearby?k=
+MAX_NEARBY = 50
+# The pbtext body is read and parsed in pieces of this many bytes
+PBTEXT_CHUNK_SIZE = 64 * 1024
+
+# Trolley route IDs (based on SDMTS system). Only used without a GTFS index
+# (see gtfs_static), which knows every route's type and name.
+TROLLEY_ROUTES = {"510", "520", "530", "532", "540"}
+TROLLEY_LINES = {
+    "510": "Blue",
+    "520": "Orange",
+    "530": "Green",
+    "532": "Green",     # Green Line short-turn variant
+    "540": "Copper",
+}
 
 
 def _trolley_line_from_route(route_id: str) -> str:
+    return TROLLEY_LINES.get(route_id, "Trolley")
+
+
+# pbtext scanning. The body is read once, left to right, as a stream of tokens: a
+# message opening ("name {"), a closing brace, or a scalar field ("name: value"). The
+# nesting of the openings and closings tells an entity's own `id` from its vehicle's.
+#
+# A further token kind takes a whole vehicle entity in one match, as long as it is laid
+# out the way the text format prints it: each message's fields in field-number order,
+# unknown scalar fields only after the known ones. Every field we read has its own slot
+# in that pattern, so its nesting is fixed by where it matched. Anything else (a known
+# field out of place, another nested message, escaped strings) fails that pattern, and
+# the entity is read token by token instead.
+_PBTEXT_STR = r'"[^"\\]*"'
+_PBTEXT_NUM = r"[-+.\w]+"
+_PBTEXT_ENUM = r"\w+"
+
+
+def _pbtext_field(name: str, value: str = _PBTEXT_ENUM, group: Optional[str] = None) -> Tuple[str, str]:
+    """(name, pattern) for a scalar field, capturing its value (unquoted) as `group`."""
+    if group is not None:
+        value = rf'"(?P<{group}>[^"\\]*)"' if value == _PBTEXT_STR else rf"(?P<{group}>{value})"
+    return name, rf"{name}:\s*{value}\s*"
+
+
+def _pbtext_message(name: str, *fields: Tuple[str, str]) -> Tuple[str, str]:
+    """(name, pattern) for a message holding `fields` in this order, each optional."""
+    known = "|".join(field for field, _ in fields)
+    # Each field is an atomic optional part: (?>...|) runs faster in re than (?:...)?,
+    # and a field that matched its slot is not tried again as missing when a later part fails.
+    body = "".join(rf"(?>{pattern}|)" for _, pattern in fields)
+    others = rf"(?:(?!(?:{known})\s*[:{{])(?:\w+|\[[^\]]*\]):\s*(?:{_PBTEXT_STR}|{_PBTEXT_NUM})\s*)*"
+    return name, rf"{name}\s*\{{\s*{body}{others}\}}\s*"
+
+
+_PBTEXT_VEHICLE_ENTITY = _pbtext_message(
+    "entity",
+    _pbtext_field("id", _PBTEXT_STR, "id"),
+    _pbtext_field("is_deleted", group="deleted"),
+    _pbtext_message(
+        "vehicle",
+        _pbtext_message(
+            "trip",
+            _pbtext_field("trip_id", _PBTEXT_STR, "trip_id"),
+            _pbtext_field("start_time", _PBTEXT_STR),
+            _pbtext_field("start_date", _PBTEXT_STR),
+            _pbtext_field("schedule_relationship"),
+            _pbtext_field("route_id", _PBTEXT_STR, "route_id"),
+            _pbtext_field("direction_id", _PBTEXT_NUM),
+        ),
+        _pbtext_message(
+            "position",
+            _pbtext_field("latitude", _PBTEXT_NUM, "latitude"),
+            _pbtext_field("longitude", _PBTEXT_NUM, "longitude"),
+            _pbtext_field("bearing", _PBTEXT_NUM),
+            _pbtext_field("odometer", _PBTEXT_NUM),
+            _pbtext_field("speed", _PBTEXT_NUM),
+        ),
+        _pbtext_field("current_stop_sequence", _PBTEXT_NUM),
+        _pbtext_field("current_status"),
+        _pbtext_field("timestamp", _PBTEXT_NUM, "timestamp"),
+        _pbtext_field("congestion_level"),
+        _pbtext_field("stop_id", _PBTEXT_STR),
+        _pbtext_message(
+            "vehicle",
+            _pbtext_field("id", _PBTEXT_STR, "vehicle_id"),
+            _pbtext_field("label", _PBTEXT_STR),
+            _pbtext_field("license_plate", _PBTEXT_STR),
+            _pbtext_field("wheelchair_accessible"),
+        ),
+        _pbtext_field("occupancy_status"),
+        _pbtext_field("occupancy_percentage", _PBTEXT_NUM),
+    ),
+)[1]
+_PBTEXT_TOKEN = re.compile(
+    rf"(?P<entity>{_PBTEXT_VEHICLE_ENTITY})"
+    # Names may be [extension.names], and a message may be opened as "name: {" too.
+    # Each token takes the whitespace after it, so matching resumes on the next token.
+    r"|(?:(?P<name>\w+|\[[^\]]*\])\s*(?::\s*)?"
+    r'(?:(?P<open>\{)|"(?P<string>[^"\\]*(?:\\.[^"\\]*)*)"|(?P<value>[^\s{}]+))'
+    r"|(?P<close>\})|(?P<comment>#.*))\s*"
+)
+_PBTEXT_ENTITY_GROUPS = ("id", "deleted", "latitude", "longitude", "route_id", "vehicle_id", "timestamp", "trip_id")
+# Where each of those fields sits inside an entity, for the token-by-token path
+_PBTEXT_ENTITY_PATHS = (
+    ("id",),
+    ("is_deleted",),
+    ("vehicle", "position", "latitude"),
+    ("vehicle", "position", "longitude"),
+    ("vehicle", "trip", "route_id"),
+    ("vehicle", "vehicle", "id"),
+    ("vehicle", "timestamp"),
+    ("vehicle", "trip", "trip_id"),
+)
+# Entities are top-level messages starting on a line of their own, so a streamed body
+# can be cut just before the last "\nentity" seen so far.
+_PBTEXT_CUT = "\nentity"
+
+
+def _vehicle_record(
+    entity_id: str,
+    latitude: float,
+    longitude: float,
+    route_id: Optional[str],
+    vehicle_id: Optional[str],
+    timestamp: Optional[int],
+    trip_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    gtfs = gtfs_static.current()
+    if gtfs is None:
+        # Called once per vehicle per poll: keep the common no-index case short.
+        if route_id is None:
+            route_id = "unknown"
+        trolley = route_id in TROLLEY_ROUTES
+        return {
+            "id": entity_id,
+            "latitude": latitude,
+            "longitude": longitude,
+            "route_id": route_id,
+            "vehicle_type": "trolley" if trolley else "bus",
+            "trolley_line": _trolley_line_from_route(route_id) if trolley else None,
+            "vehicle_id": vehicle_id,
+            "timestamp": timestamp,
+            "trip_id": trip_id,
+            "route_name": None,
+            "route_color": None,
+            "stop_id": None,
+            "stop_name": None,
+        }
+    if route_id is None and trip_id is not None:
+        route_id = gtfs.route_for_trip(trip_id)
+    route_id = route_id if route_id is not None else "unknown"
+    route = gtfs.route(route_id)
+    if route is not None:
+        vehicle_type = "trolley" if route.is_tram else "bus"
+    else:
+        vehicle_type = "trolley" if route_id in TROLLEY_ROUTES else "bus"
+    trolley_line = None
+    if vehicle_type == "trolley":
+        trolley_line = (route.line if route is not None else None) or _trolley_line_from_route(route_id)
+    stop = gtfs.nearest_stop(latitude, longitude)
+
     return {
-        "510": "Blue",
-        "520": "Orange",
-        "530": "Green",
-        "540": "Copper",
-    }.get(route_id, "Trolley")
+        "id": entity_id,
+        "latitude": latitude,
+        "longitude": longitude,
+        "route_id": route_id,
+        "vehicle_type": vehicle_type,
+        "trolley_line": trolley_line,
+        "vehicle_id": vehicle_id,
+        "timestamp": timestamp,
+        "trip_id": trip_id,
+        # From the static GTFS index
+        "route_name": route.name if route is not None else None,
+        "route_color": route.color if route is not None else None,
+        "stop_id": stop[1].stop_id if stop else None,
+        "stop_name": stop[1].name if stop else None,
+    }
+
+
+def _pbtext_vehicle(
+    entity_id: Optional[str],
+    deleted: Optional[str],
+    latitude: Optional[str],
+    longitude: Optional[str],
+    route_id: Optional[str],
+    vehicle_id: Optional[str],
+    timestamp: Optional[str],
+    trip_id: Optional[str],
+) -> Optional[Dict[str, Any]]:
+    """An entity's fields, as text -> vehicle dict, or None if it has no usable position."""
+    if entity_id is None or latitude is None or longitude is None or deleted == "true":
+        return None
+    try:
+        return _vehicle_record(
+            entity_id,
+            float(latitude),
+            float(longitude),
+            route_id,
+            vehicle_id,
+            int(timestamp) if timestamp is not None else None,
+            trip_id,
+        )
+    except ValueError:
+        # Skip malformed entries
+        return None
+
+
+def _pbtext_scan(text: str, vehicles: List[Dict[str, Any]]) -> None:
+    """One pass over complete top-level messages, appending a dict per vehicle entity."""
+    path: List[str] = []                            # names of the messages we are inside
+    fields: Dict[Tuple[str, ...], str] = {}         # the current entity's fields, by path
+    for m in _PBTEXT_TOKEN.finditer(text):
+        kind = m.lastgroup
+        if kind == "entity":
+            vehicle = _pbtext_vehicle(*m.group(*_PBTEXT_ENTITY_GROUPS))
+        elif kind == "open":
+            path.append(m["name"])
+            if len(path) == 1:
+                fields = {}
+            continue
+        elif kind == "close":
+            if not path or path.pop() != "entity" or path:
+                continue
+            vehicle = _pbtext_vehicle(*(fields.get(p) for p in _PBTEXT_ENTITY_PATHS))
+        elif kind == "comment":
+            continue
+        else:
+            # A scalar field (kind is "string" or "value", whichever group holds it).
+            # Only an entity's fields are kept, the first value of each.
+            if path and path[0] == "entity":
+                fields.setdefault((*path[1:], m["name"]), m[kind])
+            continue
+        if vehicle is not None:
+            vehicles.append(vehicle)
 
 
-def parse_pbtext_response(text: str) -> List[Dict[str, Any]]:
+def parse_pbtext_response(text: Union[str, Iterable[str]]) -> List[Dict[str, Any]]:
     """
     Parse the human-readable pbtext format response.
     
@@ -46,64 +295,253 @@ def parse_pbtext_response(text: str) -> List[Dict[str, Any]]:
         }
       }
     }
+
+    `text` may also be an iterable of string chunks, e.g. a streamed response
+    body. Complete entities are scanned as chunks arrive, so only one partial
+    entity is held between chunks.
+    """
+    vehicles: List[Dict[str, Any]] = []
+    if isinstance(text, str):
+        _pbtext_scan(text, vehicles)
+        return vehicles
+
+    tail = ""
+    for chunk in text:
+        buf = tail + chunk
+        cut = buf.rfind(_PBTEXT_CUT)
+        if cut <= 0:
+            tail = buf
+            continue
+        _pbtext_scan(buf[:cut], vehicles)
+        tail = buf[cut:]
+    _pbtext_scan(tail, vehicles)
+    return vehicles
+
+
+# -----------------------------
+# Binary GTFS-Realtime decoding
+# Just enough of the protobuf wire format to read the VehiclePosition fields above;
+# everything else is skipped by length without being decoded.
+# -----------------------------
+_WIRE_VARINT, _WIRE_I64, _WIRE_LEN, _WIRE_I32 = 0, 1, 2, 5
+_FLOAT32 = struct.Struct("<f")
+_LAT_LON = struct.Struct("<xfxf")      # Position fields 1 and 2 with their one-byte keys
+
+
+def _read_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+        if shift > 63:
+            raise ValueError("varint too long")
+
+
+def _skip_field(buf: bytes, pos: int, wire: int) -> int:
+    """Position after the value of a field we don't read (its key already consumed)."""
+    if wire == _WIRE_VARINT:
+        while buf[pos] >= 0x80:
+            pos += 1
+        return pos + 1
+    if wire == _WIRE_LEN:
+        n, pos = _read_varint(buf, pos)
+        return pos + n
+    if wire == _WIRE_I32:
+        return pos + 4
+    if wire == _WIRE_I64:
+        return pos + 8
+    raise ValueError(f"unsupported wire type {wire}")
+
+
+# The decoders below walk each message in an inline loop over the bytes, comparing
+# whole one-byte keys (field number and wire type; every field we read is below 16).
+# Lengths and keys below 128 take one byte and are read in place; only longer
+# varints call _read_varint. Entities are decoded where they sit, without copies.
+
+def _decode_trip(buf: bytes, pos: int, end: int) -> Tuple[Optional[str], Optional[str]]:
+    """TripDescriptor -> (trip_id, route_id)."""
+    trip_id = route_id = None
+    while pos < end:
+        key = buf[pos]
+        pos += 1
+        if key == 0x0A or key == 0x2A:      # 1: trip_id, 5: route_id (LEN)
+            n = buf[pos]
+            pos += 1
+            if n >= 0x80:
+                n, pos = _read_varint(buf, pos - 1)
+            value = str(buf[pos:pos + n], "utf-8", "replace")
+            pos += n
+            if key == 0x0A:
+                trip_id = value
+            else:
+                route_id = value
+            if trip_id is not None and route_id is not None:
+                break
+        elif key < 0x80 and key & 7 == _WIRE_VARINT:
+            while buf[pos] >= 0x80:
+                pos += 1
+            pos += 1
+        else:
+            if key >= 0x80:
+                key, pos = _read_varint(buf, pos - 1)
+            pos = _skip_field(buf, pos, key & 7)
+    if pos > end:
+        raise ValueError("truncated message")
+    return trip_id, route_id
+
+
+def _decode_position(buf: bytes, pos: int, end: int) -> Tuple[Optional[float], Optional[float]]:
+    """Position -> (latitude, longitude)."""
+    if end - pos >= 10 and buf[pos] == 0x0D and buf[pos + 5] == 0x15:
+        # Fields 1 and 2 come first, as encoders write them: both in one unpack.
+        latitude, longitude = _LAT_LON.unpack_from(buf, pos)
+        return round(latitude, 6), round(longitude, 6)
+    latitude = longitude = None
+    while pos < end:
+        key = buf[pos]
+        pos += 1
+        if key == 0x0D:                     # 1: latitude (float)
+            latitude = round(_FLOAT32.unpack_from(buf, pos)[0], 6)
+            pos += 4
+        elif key == 0x15:                   # 2: longitude (float)
+            longitude = round(_FLOAT32.unpack_from(buf, pos)[0], 6)
+            pos += 4
+        else:
+            if key >= 0x80:
+                key, pos = _read_varint(buf, pos - 1)
+            pos = _skip_field(buf, pos, key & 7)
+    if pos > end:
+        raise ValueError("truncated message")
+    return latitude, longitude
+
+
+def _decode_descriptor_id(buf: bytes, pos: int, end: int) -> Optional[str]:
+    """VehicleDescriptor -> id."""
+    vehicle_id = None
+    while pos < end:
+        key = buf[pos]
+        pos += 1
+        if key == 0x0A:                     # 1: id (LEN)
+            n = buf[pos]
+            pos += 1
+            if n >= 0x80:
+                n, pos = _read_varint(buf, pos - 1)
+            vehicle_id = str(buf[pos:pos + n], "utf-8", "replace")
+            pos += n
+            break
+        else:
+            if key >= 0x80:
+                key, pos = _read_varint(buf, pos - 1)
+            pos = _skip_field(buf, pos, key & 7)
+    if pos > end:
+        raise ValueError("truncated message")
+    return vehicle_id
+
+
+def _decode_vehicle_entity(buf: bytes, pos: int, end: int) -> Optional[Dict[str, Any]]:
+    entity_id = None
+    vehicle_start = vehicle_end = -1
+    while pos < end:
+        key = buf[pos]
+        pos += 1
+        if key == 0x0A or key == 0x22:      # FeedEntity 1: id, 4: vehicle (LEN)
+            n = buf[pos]
+            pos += 1
+            if n >= 0x80:
+                n, pos = _read_varint(buf, pos - 1)
+            if key == 0x0A:
+                entity_id = str(buf[pos:pos + n], "utf-8", "replace")
+            else:
+                vehicle_start, vehicle_end = pos, pos + n
+            pos += n
+        elif key == 0x10:                   # FeedEntity 2: is_deleted (varint)
+            if buf[pos]:
+                return None
+            pos += 1
+        else:
+            if key >= 0x80:
+                key, pos = _read_varint(buf, pos - 1)
+            pos = _skip_field(buf, pos, key & 7)
+    if pos > end:
+        raise ValueError("truncated message")
+    if entity_id is None or vehicle_start < 0:
+        return None
+
+    route_id = vehicle_id = trip_id = None
+    latitude = longitude = None
+    timestamp = None
+    pos, end = vehicle_start, vehicle_end
+    while pos < end:
+        key = buf[pos]
+        pos += 1
+        if key == 0x28:                     # VehiclePosition 5: timestamp (varint)
+            timestamp, pos = _read_varint(buf, pos)
+        elif key == 0x0A or key == 0x12 or key == 0x42:
+            # VehiclePosition 1: trip, 2: position, 8: vehicle (LEN)
+            n = buf[pos]
+            pos += 1
+            if n >= 0x80:
+                n, pos = _read_varint(buf, pos - 1)
+            if key == 0x0A:
+                trip_id, route_id = _decode_trip(buf, pos, pos + n)
+            elif key == 0x12:
+                latitude, longitude = _decode_position(buf, pos, pos + n)
+            else:
+                vehicle_id = _decode_descriptor_id(buf, pos, pos + n)
+            pos += n
+        elif key < 0x80 and key & 7 == _WIRE_VARINT:
+            while buf[pos] >= 0x80:
+                pos += 1
+            pos += 1
+        else:
+            if key >= 0x80:
+                key, pos = _read_varint(buf, pos - 1)
+            pos = _skip_field(buf, pos, key & 7)
+    if pos > end:
+        raise ValueError("truncated message")
+    if latitude is None or longitude is None:
+        return None
+
+    return _vehicle_record(entity_id, latitude, longitude, route_id, vehicle_id, timestamp, trip_id)
+
+
+def parse_feed_message(data: bytes) -> List[Dict[str, Any]]:
+    """
+    Decode a binary GTFS-RT FeedMessage into the same vehicle dicts as parse_pbtext_response.
+    Malformed entities are skipped; a malformed envelope raises ValueError.
     """
     vehicles = []
-    
-    # Split into entity blocks
-    entity_blocks = re.split(r'entity\s*{', text)
-    
-    for block in entity_blocks[1:]:  # Skip first empty split
-        try:
-            # Extract entity id
-            entity_id_match = re.search(r'id:\s*"([^"]+)"', block)
-            if not entity_id_match:
-                continue
-            entity_id = entity_id_match.group(1)
-            
-            # Extract route_id
-            route_id_match = re.search(r'route_id:\s*"([^"]+)"', block)
-            route_id = route_id_match.group(1) if route_id_match else "unknown"
-            
-            # Extract latitude
-            lat_match = re.search(r'latitude:\s*([-\d.]+)', block)
-            if not lat_match:
-                continue
-            latitude = float(lat_match.group(1))
-            
-            # Extract longitude
-            lon_match = re.search(r'longitude:\s*([-\d.]+)', block)
-            if not lon_match:
+    buf = data
+    pos, end = 0, len(buf)
+    try:
+        while pos < end:
+            key = buf[pos]
+            pos += 1
+            if key >= 0x80:
+                key, pos = _read_varint(buf, pos - 1)
+            if key != 0x12:                 # FeedMessage 2: entity (LEN)
+                pos = _skip_field(buf, pos, key & 7)
                 continue
-            longitude = float(lon_match.group(1))
-            
-            # Extract vehicle id (nested in vehicle { id: "..." })
-            vehicle_id_match = re.search(r'vehicle\s*{\s*id:\s*"([^"]+)"', block)
-            vehicle_id = vehicle_id_match.group(1) if vehicle_id_match else None
-            
-            # Extract timestamp (Unix epoch timestamp in seconds, UTC)
-            timestamp_match = re.search(r'timestamp:\s*(\d+)', block)
-            timestamp = int(timestamp_match.group(1)) if timestamp_match else None
-            
-            # Determine vehicle type
-            vehicle_type = "trolley" if route_id in TROLLEY_ROUTES else "bus"
-            trolley_line = _trolley_line_from_route(route_id) if vehicle_type == "trolley" else None
-            
-            vehicle_data = {
-                "id": entity_id,
-                "latitude": latitude,
-                "longitude": longitude,
-                "route_id": route_id,
-                "vehicle_type": vehicle_type,
-                "trolley_line": trolley_line,
-                "vehicle_id": vehicle_id,
-                "timestamp": timestamp,
-            }
-            vehicles.append(vehicle_data)
-            
-        except (ValueError, AttributeError) as e:
-            # Skip malformed entries
-            continue
-    
+            n = buf[pos]
+            pos += 1
+            if n >= 0x80:
+                n, pos = _read_varint(buf, pos - 1)
+            try:
+                vehicle = _decode_vehicle_entity(buf, pos, pos + n)
+            except (ValueError, IndexError, struct.error):
+                vehicle = None
+            if vehicle is not None:
+                vehicles.append(vehicle)
+            pos += n
+    except IndexError as e:
+        raise ValueError("truncated GTFS-RT feed") from e
+    if pos > end:
+        raise ValueError("truncated GTFS-RT feed")
     return vehicles
 
 
@@ -131,10 +569,11 @@ def get_mock_vehicle_positions() -> Dict[str, Any]:
     }
 
 
-def get_vehicle_positions() -> Dict[str, Any]:
+def fetch_vehicle_positions() -> Dict[str, Any]:
     """
     Fetch current vehicle positions from SDMTS API.
     Returns a dict with vehicle data including position, route, and vehicle type.
+    This always hits the network; request handlers should use get_vehicle_positions().
     """
     # Check if we should use mock data (for testing)
     if os.environ.get("USE_MOCK_TRANSIT", "false").lower() == "true":
@@ -142,11 +581,40 @@ def get_vehicle_positions() -> Dict[str, Any]:
     
     try:
         url = f"{SDMTS_API_URL}?key={API_KEY}"
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        
-        # Parse the text response
-        vehicles = parse_pbtext_response(response.text)
+        # While SDMTS keeps failing, skip polls (backing off) instead of waiting out timeouts.
+        breaker = breaker_for(url)
+        attempt = breaker.check()
+        start = time.perf_counter()
+        try:
+            response = requests.get(url, timeout=10, stream=(SDMTS_FEED_FORMAT != "protobuf"))
+        except requests.exceptions.RequestException:
+            breaker.failure(attempt)
+            metrics.upstream_responses.inc("sdmts", "error")
+            raise
+        finally:
+            metrics.upstream_latency.observe(time.perf_counter() - start, "sdmts")
+        metrics.upstream_responses.inc("sdmts", str(response.status_code))
+        if response.status_code >= 500 or response.status_code == 429:
+            breaker.failure(attempt)
+        else:
+            breaker.success()
+
+        with response:
+            response.raise_for_status()
+            # Pick up a newly ingested static GTFS index before enriching this poll's vehicles.
+            gtfs_static.refresh()
+
+            source = f"vehicles_{SDMTS_FEED_FORMAT}"
+            with metrics.parse_duration.time(source):
+                if SDMTS_FEED_FORMAT == "protobuf":
+                    vehicles = parse_feed_message(response.content)
+                else:
+                    # Parse the text response entity by entity as it arrives
+                    vehicles = parse_pbtext_response(
+                        codecs.iterdecode(response.iter_content(PBTEXT_CHUNK_SIZE), "utf-8")
+                    )
+            # Bytes actually read off the socket (the body may be streamed, so no len())
+            metrics.payload_size.observe(response.raw.tell(), source)
         
         return {
             "success": True,
@@ -154,6 +622,14 @@ def get_vehicle_positions() -> Dict[str, Any]:
             "count": len(vehicles),
         }
         
+    except CircuitOpenError as e:
+        metrics.upstream_responses.inc("sdmts", "circuit_open")
+        return {
+            "success": False,
+            "error": f"Transit feed unavailable: {e}",
+            "vehicles": [],
+            "count": 0,
+        }
     except requests.exceptions.RequestException as e:
         # In production, return empty list with error
         return {
@@ -169,3 +645,187 @@ def get_vehicle_positions() -> Dict[str, Any]:
             "vehicles": [],
             "count": 0,
         }
+
+
+# -----------------------------
+# Shared snapshot
+# -----------------------------
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    One published view of the fleet. Snapshots are never mutated after publishing
+    (treat the vehicle dicts as read-only too); the poller swaps in a new one.
+    `version` only changes when the vehicle list changes.
+    """
+    version: int
+    vehicles: Tuple[Dict[str, Any], ...]
+    fetched_at: Optional[float]     # time of the last successful poll
+    error: Optional[str] = None     # set when the most recent poll failed
+    mock: bool = False
+    # Derived lookups, built once per published version
+    by_id: Dict[str, Dict[str, Any]] = field(default_factory=dict, compare=False, repr=False)
+    index: GridIndex = field(default_factory=lambda: GridIndex(()), compare=False, repr=False)
+
+
+def _build_snapshot(version: int, vehicles: Tuple[Dict[str, Any], ...], fetched_at: float, mock: bool) -> Snapshot:
+    return Snapshot(
+        version=version,
+        vehicles=vehicles,
+        fetched_at=fetched_at,
+        mock=mock,
+        by_id={v["id"]: v for v in vehicles},
+        index=GridIndex((v["latitude"], v["longitude"], v) for v in vehicles),
+    )
+
+
+# Versions start from the process start time so a client holding a version from
+# before a restart can never match one issued after it.
+_snapshot = Snapshot(version=int(time.time()), vehicles=(), fetched_at=None, error="Waiting for first transit poll")
+# Follows _snapshot.version, so listeners can wait for the fleet to change.
+transit_changes = ChangeFeed(_snapshot.version)
+# The last DELTA_HISTORY published snapshots by version, oldest first
+_history: "OrderedDict[int, Snapshot]" = OrderedDict()
+
+
+def current_snapshot() -> Snapshot:
+    return _snapshot
+
+
+def _publish(result: Dict[str, Any]) -> Snapshot:
+    global _snapshot
+    prev = _snapshot
+    if result.get("success"):
+        vehicles = tuple(result["vehicles"])
+        if vehicles == prev.vehicles and prev.fetched_at is not None:
+            _snapshot = replace(prev, fetched_at=time.time(), error=None)
+        else:
+            _snapshot = _build_snapshot(prev.version + 1, vehicles, time.time(), bool(result.get("mock")))
+        vehicle_history.record(vehicles, _snapshot.fetched_at)
+        version = _snapshot.version
+        if version != prev.version:
+            _history[version] = _snapshot
+            while len(_history) > DELTA_HISTORY:
+                _history.popitem(last=False)
+            transit_changes.bump(version)
+    else:
+        # Keep serving the last good fleet, but say why it is not updating.
+        _snapshot = replace(prev, error=result.get("error"))
+    return _snapshot
+
+
+async def poll_once() -> Snapshot:
+    if os.environ.get("USE_MOCK_TRANSIT", "false").lower() == "true":
+        return _publish(get_mock_vehicle_positions())
+    # requests + parsing are blocking; keep them off the event loop.
+    return _publish(await asyncio.to_thread(fetch_vehicle_positions))
+
+
+async def run_poller() -> None:
+    """Background loop (started by the app) that refreshes the shared snapshot every POLL_INTERVAL."""
+    while True:
+        started = time.monotonic()
+        try:
+            await poll_once()
+        except Exception as e:
+            log.warning("Transit poll failed: %s", e)
+        await asyncio.sleep(max(0.0, POLL_INTERVAL - (time.monotonic() - started)))
+
+
+def snapshot_age(snapshot: Snapshot) -> Optional[float]:
+    if snapshot.fetched_at is None:
+        return None
+    return max(0.0, time.time() - snapshot.fetched_at)
+
+
+def snapshot_stale(snapshot: Snapshot) -> bool:
+    """True once the poller has fallen behind (or has never succeeded)."""
+    age = snapshot_age(snapshot)
+    return age is None or age > STALE_AFTER_POLLS * POLL_INTERVAL
+
+
+def _snapshot_meta(snap: Snapshot, count: int) -> Dict[str, Any]:
+    age = snapshot_age(snap)
+    out: Dict[str, Any] = {
+        "success": snap.fetched_at is not None,
+        "count": count,
+        "version": snap.version,
+        "updated_at": int(snap.fetched_at) if snap.fetched_at is not None else None,
+        "age_seconds": round(age, 1) if age is not None else None,
+        "stale": snapshot_stale(snap),
+    }
+    if snap.error:
+        out["error"] = snap.error
+    if snap.mock:
+        out["mock"] = True
+    return out
+
+
+def _members(snap: Snapshot, bbox: Optional[BBox]) -> Dict[str, Dict[str, Any]]:
+    if bbox is None:
+        return snap.by_id
+    return {v["id"]: v for v in snap.index.bbox(bbox)}
+
+
+def get_vehicle_positions(since: Optional[int] = None, bbox: Optional[BBox] = None) -> Dict[str, Any]:
+    """
+    Current vehicle positions from the shared in-memory snapshot.
+    Never touches the network; `stale` is true when the poller has fallen behind.
+
+    With `since`, only the changes from that version are returned:
+    `upserts` (vehicles added or changed) and `removed` (ids). If that version is
+    no longer in the history, the full list comes back with `full: true`.
+    With `bbox`, only vehicles inside it count; one that drives out is reported as removed.
+    """
+    snap = _snapshot
+    current = _members(snap, bbox)
+    out = _snapshot_meta(snap, len(current))
+    old_snap = _history.get(since) if since is not None else None
+    if since is not None and since == snap.version:
+        out.update(full=False, since=since, upserts=[], removed=[])
+    elif old_snap is not None and snap.version in _history:
+        old = _members(old_snap, bbox)
+        out.update(
+            full=False,
+            since=since,
+            upserts=[v for vid, v in current.items() if old.get(vid) != v],
+            removed=[vid for vid in old if vid not in current],
+        )
+    else:
+        out.update(full=True, vehicles=list(current.values()) if bbox is not None else list(snap.vehicles))
+    return out
+
+
+def get_nearby_vehicles(lat: float, lon: float, k: int = 5) -> Dict[str, Any]:
+    """The k vehicles closest to (lat, lon), nearest first, each with `distance_m`."""
+    snap = _snapshot
+    k = max(1, min(k, MAX_NEARBY))
+    nearest = snap.index.nearest(lat, lon, k)
+    out = _snapshot_meta(snap, len(nearest))
+    out["vehicles"] = [dict(v, distance_m=round(d)) for d, v in nearest]
+    return out
+
+
+def get_vehicle_trails(points: Optional[int] = None, at: Optional[float] = None, bbox: Optional[BBox] = None) -> Dict[str, Any]:
+    """
+    Recent positions for each current vehicle as [lat, lon, ts] (oldest first), plus
+    heading, speed and the position estimated for time `at` (default: now) where
+    there are at least two reports to work from.
+    """
+    snap = _snapshot
+    members = _members(snap, bbox)
+    at = time.time() if at is None else at
+    motion = vehicle_history.motion(members, at)
+    out = _snapshot_meta(snap, len(members))
+    out["at"] = at
+    out["vehicles"] = [
+        {
+            "id": vid,
+            "trail": [[round(lat, 6), round(lon, 6), int(ts)] for lat, lon, ts in vehicle_history.trail(vid, points)],
+            **motion.get(vid, {}),
+        }
+        for vid in members
+    ]
+    return out
@@ -1,12 +1,26 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import logging
+import os
+import re
 import time
+from collections import OrderedDict
+from contextvars import ContextVar
 from dataclasses import dataclass
+from datetime import datetime
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Set, Tuple, Union
 
-import requests
+import httpx
+
+from .. import metrics
+from . import nws_gridpoints
+from .breaker import CircuitOpenError, breaker_for
+from .cache_store import JsonFileStore, SqliteStore, cache_tier, open_store
+from .changes import ChangeFeed
 
 
 # -----------------------------
@@ -19,14 +33,63 @@ CITIES: List[Dict[str, Any]] = [
     {"name": "Poway, CA", "lat": 32.9628, "lon": -117.0359},
 ]
 
-# Cache TTLs (seconds)
+# Other kiosks can ask for their own list: /api/weather?profile=<name> picks one of
+# these, ?cities=Name@lat,lon;... gives one inline. Extra profiles can be loaded from a
+# JSON file of {"<profile>": [{"name", "lat", "lon"}, ...]} named by NWS_PROFILES_FILE.
+PROFILES: Dict[str, List[Dict[str, Any]]] = {"default": CITIES}
+MAX_REQUEST_CITIES = 8
+
+# Cache TTLs (seconds). Freshness normally comes from the upstream Cache-Control/Expires
+# headers; these are the upper bounds, and TTL_MIN is the floor.
 TTL_POINTS = 7 * 24 * 3600          # points->grid mapping changes rarely
 TTL_HOURLY = 10 * 60                # current conditions feel "live"
 TTL_FORECAST = 30 * 60              # daily/weekly forecast OK to refresh slower
+TTL_GRIDPOINT = TTL_HOURLY          # raw mode: one download feeds current conditions too
+TTL_MIN = 60                        # never hammer NWS, even if it says no-cache
+
+# On-disk cache entry format. Bump when the projected fields below change;
+# older entries are re-projected from their raw payload on first read (entries that
+# were already projected have no raw payload left and are simply refetched).
+CACHE_FORMAT = 3
+
+# The only period fields the dashboard reads. Everything else NWS sends is dropped at fetch time.
+HOURLY_FIELDS = (
+    "startTime", "temperature", "icon", "shortForecast", "probabilityOfPrecipitation",
+    "windSpeed", "isDaytime", "cloudCover",
+)
+FORECAST_FIELDS = (
+    "name", "isDaytime", "temperature", "icon", "shortForecast",
+    "detailedForecast", "probabilityOfPrecipitation",
+)
+
+# /api/weather/hourly: series length when not asked for, and the cap (NWS gives ~156 hours)
+HOURLY_DEFAULT_HOURS = 48
+HOURLY_MAX_HOURS = 168
+HOUR = 3600
+
+# Background refresher: wake up this often, and refresh keys this close to expiry
+REFRESH_INTERVAL = int(os.environ.get("NWS_REFRESH_INTERVAL", "30"))
+REFRESH_MARGIN = 90
 
 # Disk cache location (inside repo; service user everett can write here)
-CACHE_DIR = Path(__file__).resolve().parents[3] / "cache"
-CACHE_DIR.mkdir(parents=True, exist_ok=True)
+CACHE_DIR = Path(os.environ.get("PETER_CACHE_DIR", Path(__file__).resolve().parents[3] / "cache"))
+# "sqlite" (one shared database, safe with several workers) or "json" (one file per key)
+CACHE_BACKEND = os.environ.get("PETER_CACHE_BACKEND", "sqlite").lower()
+# How often the refresher trims the cache to its size bound
+EVICT_INTERVAL = 3600
+# Keys only requested for ad-hoc city lists stop being refreshed after this long unrequested
+TRACK_IDLE_SECONDS = 3600
+
+# Where forecasts come from: "forecast" fetches /forecast and /forecast/hourly per grid;
+# "raw" fetches the /gridpoints layers both are generated from once and derives the
+# hourly and day/night periods locally (see nws_gridpoints; no NWS icons in that mode).
+GRID_MODES = ("forecast", "raw")
+NWS_GRID_MODE = os.environ.get("NWS_GRID_MODE", "forecast").lower()
+if NWS_GRID_MODE not in GRID_MODES:
+    raise ValueError(f"Unknown NWS_GRID_MODE: {NWS_GRID_MODE!r} (expected 'forecast' or 'raw')")
+
+# Overridable so benchmarks can point the provider at a local stand-in server
+NWS_BASE_URL = os.environ.get("NWS_BASE_URL", "https://api.weather.gov").rstrip("/")
 
 HEADERS = {
     # NWS requests a descriptive UA with contact
@@ -34,6 +97,72 @@ HEADERS = {
     "Accept": "application/geo+json",
 }
 
+# Upstream fetching: one shared keep-alive client, at most this many requests in flight.
+MAX_CONCURRENCY = int(os.environ.get("NWS_MAX_CONCURRENCY", "6"))
+REQUEST_TIMEOUT = 15
+# Upper bound on how long a request waits for NWS. Past it (or while NWS's circuit breaker
+# is open) the last good payload for the same cities is served, marked stale.
+REQUEST_DEADLINE = float(os.environ.get("NWS_REQUEST_DEADLINE", "4"))
+LAST_GOOD_PAYLOADS = 32
+# Views derived from a grid's cached data (hourly timelines, raw-mode periods) are kept for this many grids,
+# least recently used dropped first, so ad-hoc city lists cannot grow them without bound.
+GRID_VIEWS = 32
+# A worker holds a key's fetch lease this long at most; others wait for its result meanwhile.
+LEASE_SECONDS = 2 * REQUEST_TIMEOUT
+PEER_POLL_INTERVAL = 0.25
+
+_client: Optional[httpx.AsyncClient] = None
+_limiter: Optional[asyncio.Semaphore] = None
+
+Projector = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+# cache_key -> (url, ttl, projector, last requested) for every key the dashboard has asked for;
+# the refresher walks these. Keys for CITIES and PROFILES are pinned and never age out.
+_tracked: Dict[str, Tuple[str, int, Projector, float]] = {}
+_pinned: Set[str] = set()
+# Set while the refresher builds the configured profiles, so the keys they touch get pinned.
+_pinning: ContextVar[bool] = ContextVar("_pinning", default=False)
+# Keys served past their TTL, or whose refresh failed past it, since their last successful
+# refresh. Their next refresh announces a change even if the data is the same, so payloads
+# marked stale get rebuilt.
+_served_stale: Set[str] = set()
+# What the payload being built was made from (see _build_payload).
+_sources: ContextVar[Optional["_Sources"]] = ContextVar("_sources", default=None)
+CitiesKey = Tuple[Tuple[str, float, float], ...]
+# A payload variant: a city list key for /api/weather, ("hourly", cities, hours, step) for
+# /api/weather/hourly.
+BuildKey = Hashable
+Build = Tuple[float, Dict[str, Any]]     # (fetch time of the oldest entry used, payload)
+# Variant -> the payload build currently running for it. Builds outlive the deadline
+# of the request that started them, so a slow cold start still completes and fills the cache.
+_building: Dict[BuildKey, "asyncio.Task[Build]"] = {}
+# Variant -> the last build that completed.
+_last_good: "OrderedDict[BuildKey, Build]" = OrderedDict()
+# cache_key -> the one upstream fetch currently running for it (single-flight).
+_inflight: Dict[str, "asyncio.Task[Dict[str, Any]]"] = {}
+# Cache entries by key (opened on first use, so CACHE_DIR can still be changed before then).
+_store: Optional[Union[SqliteStore, JsonFileStore]] = None
+
+# Bumped whenever a refresh brings back different data, so listeners know the payload changed.
+weather_changes = ChangeFeed()
+
+log = logging.getLogger(__name__)
+
+
+class WeatherUnavailable(Exception):
+    """NWS could not be reached in time and there is no earlier payload to fall back on."""
+
+
+@dataclass
+class _Sources:
+    oldest: Optional[float] = None     # fetch time of the oldest cache entry used
+    stale: bool = False                # some entry was past its TTL
+
+    def note(self, fetched_at: float, stale: bool) -> None:
+        if self.oldest is None or fetched_at < self.oldest:
+            self.oldest = fetched_at
+        self.stale = self.stale or stale
+
 
 @dataclass(frozen=True)
 class Grid:
@@ -42,76 +171,433 @@ class Grid:
     grid_y: int
     time_zone: str
 
+    @property
+    def key(self) -> Tuple[str, int, int]:
+        return (self.grid_id, self.grid_x, self.grid_y)
+
+
+def _load_profiles(path: Optional[str]) -> None:
+    if not path:
+        return
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        for name, cities in data.items():
+            PROFILES[str(name)] = [_city(c["name"], c["lat"], c["lon"]) for c in cities]
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        log.warning("Could not load weather profiles from %s: %s", path, e)
+
+
+def _city(name: Any, lat: Any, lon: Any) -> Dict[str, Any]:
+    lat, lon = float(lat), float(lon)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(f"coordinates out of range: {lat},{lon}")
+    # Points lookups are keyed at 4 decimals; rounding here lets equal keys share everything.
+    return {"name": str(name), "lat": round(lat, 4), "lon": round(lon, 4)}
+
+
+def parse_cities(text: str) -> List[Dict[str, Any]]:
+    """
+    Parse "Name@lat,lon;Other Name@lat,lon" (the name is optional) into city dicts.
+    Raises ValueError on malformed input or more than MAX_REQUEST_CITIES entries.
+    """
+    cities = []
+    for part in filter(None, (p.strip() for p in text.split(";"))):
+        name, _, coords = part.rpartition("@")
+        lat, sep, lon = coords.partition(",")
+        if not sep:
+            raise ValueError(f"expected Name@lat,lon, got {part!r}")
+        cities.append(_city(name.strip() or coords.strip(), lat, lon))
+    if not cities:
+        raise ValueError("no cities given")
+    if len(cities) > MAX_REQUEST_CITIES:
+        raise ValueError(f"at most {MAX_REQUEST_CITIES} cities per request")
+    return cities
+
+
+def select_cities(cities: Optional[str] = None, profile: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    The city list for one request: inline `cities` wins, then a named `profile`, else CITIES.
+    Raises ValueError for a malformed list and KeyError for an unknown profile.
+    """
+    if cities is not None:
+        return parse_cities(cities)
+    if profile is not None:
+        return PROFILES[profile]
+    return CITIES
+
+
+def cities_key(cities: Optional[Sequence[Dict[str, Any]]] = None) -> CitiesKey:
+    """Hashable identity of a city list (None means CITIES), for keying payloads built from it."""
+    return tuple((c["name"], c["lat"], c["lon"]) for c in (CITIES if cities is None else cities))
+
+
+_load_profiles(os.environ.get("NWS_PROFILES_FILE"))
+
 
 def _slug(name: str) -> str:
     return "".join(ch.lower() if ch.isalnum() else "_" for ch in name).strip("_")
 
 
-def _cache_path(key: str) -> Path:
-    return CACHE_DIR / f"{key}.json"
+def _get_store() -> Union[SqliteStore, JsonFileStore]:
+    global _store
+    if _store is None:
+        _store = open_store(CACHE_DIR, CACHE_BACKEND)
+    return _store
 
 
 def _read_cache(key: str) -> Optional[Dict[str, Any]]:
-    p = _cache_path(key)
-    if not p.exists():
-        return None
-    try:
-        return json.loads(p.read_text(encoding="utf-8"))
-    except Exception:
-        return None
+    return _get_store().get(key)
 
 
 def _write_cache(key: str, payload: Dict[str, Any]) -> None:
-    p = _cache_path(key)
-    tmp = p.with_suffix(".json.tmp")
-    tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
-    tmp.replace(p)
+    _get_store().put(key, payload)
+
+
+def _project_points(data: Dict[str, Any]) -> Dict[str, Any]:
+    props = data["properties"]
+    return {
+        "gridId": props["gridId"],
+        "gridX": int(props["gridX"]),
+        "gridY": int(props["gridY"]),
+        "timeZone": props.get("timeZone", "UTC"),
+    }
+
+
+def _periods_projector(fields: Tuple[str, ...]) -> Projector:
+    """
+    Keep only `fields` from each period, stored column-ordered:
+    {"fields": [...], "rows": [[...], ...]}. probabilityOfPrecipitation is flattened to its value.
+    """
+    def project(data: Dict[str, Any]) -> Dict[str, Any]:
+        rows = []
+        for period in data["properties"]["periods"]:
+            row = []
+            for f in fields:
+                v = period.get(f)
+                if isinstance(v, dict):
+                    v = v.get("value")
+                row.append(v)
+            rows.append(row)
+        return {"fields": list(fields), "rows": rows}
+
+    return project
+
+
+_project_hourly = _periods_projector(HOURLY_FIELDS)
+_project_forecast = _periods_projector(FORECAST_FIELDS)
+
+
+def _periods_from_rows(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    fields = data["fields"]
+    return [dict(zip(fields, row)) for row in data["rows"]]
 
 
 def _now() -> float:
     return time.time()
 
 
-def _cached_get_json(url: str, cache_key: str, ttl_seconds: int) -> Dict[str, Any]:
+def _get_client() -> httpx.AsyncClient:
+    global _client, _limiter
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=MAX_CONCURRENCY,
+                max_keepalive_connections=MAX_CONCURRENCY,
+            ),
+        )
+        _limiter = asyncio.Semaphore(MAX_CONCURRENCY)
+    return _client
+
+
+async def aclose() -> None:
+    """Close the shared HTTP client and the cache store (called on app shutdown)."""
+    global _client, _limiter, _store
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _limiter = None
+    if _store is not None:
+        _store.close()
+    _store = None
+
+
+async def _fetch(url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+    client = _get_client()
+    assert _limiter is not None
+    breaker = breaker_for(url)
+    try:
+        attempt = breaker.check()
+    except CircuitOpenError:
+        metrics.upstream_responses.inc("nws", "circuit_open")
+        raise
+    async with _limiter:
+        start = time.perf_counter()
+        try:
+            r = await client.get(url, headers=headers)
+        except httpx.HTTPError:
+            breaker.failure(attempt)
+            metrics.upstream_responses.inc("nws", "error")
+            raise
+        finally:
+            metrics.upstream_latency.observe(time.perf_counter() - start, "nws")
+    metrics.upstream_responses.inc("nws", str(r.status_code))
+    # 5xx and rate limiting mean the host is struggling; other 4xx are about the request.
+    if r.status_code >= 500 or r.status_code == 429:
+        breaker.failure(attempt)
+    else:
+        breaker.success()
+    if r.status_code != 304:
+        r.raise_for_status()
+    return r
+
+
+def _upstream_lifetime(headers: httpx.Headers) -> Optional[float]:
+    """Freshness lifetime (seconds) the upstream asked for, per Cache-Control then Expires."""
+    cc = headers.get("cache-control", "").lower()
+    if "no-cache" in cc or "no-store" in cc:
+        return 0.0
+    m = re.search(r"(?:^|[,\s])max-age=(\d+)", cc)
+    if m:
+        return float(m.group(1))
+    expires = headers.get("expires")
+    if expires:
+        try:
+            exp = parsedate_to_datetime(expires)
+            date = parsedate_to_datetime(headers["date"]) if "date" in headers else None
+            base = date.timestamp() if date else _now()
+            return max(0.0, exp.timestamp() - base)
+        except (TypeError, ValueError, IndexError):
+            return None
+    return None
+
+
+def _cache_age(cached: Optional[Dict[str, Any]]) -> Optional[float]:
+    if not cached or not isinstance(cached, dict):
+        return None
+    ts = cached.get("_ts")
+    if not isinstance(ts, (int, float)):
+        return None
+    return _now() - float(ts)
+
+
+def _effective_ttl(cached: Optional[Dict[str, Any]], ttl_seconds: int) -> float:
+    """Upstream lifetime stored with the entry, clamped to [TTL_MIN, ttl_seconds]."""
+    lifetime = cached.get("_max_age") if cached else None
+    if not isinstance(lifetime, (int, float)):
+        return ttl_seconds
+    return min(max(float(lifetime), min(TTL_MIN, ttl_seconds)), ttl_seconds)
+
+
+def _cache_entry(data: Dict[str, Any], r: httpx.Response, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    entry: Dict[str, Any] = {"_v": CACHE_FORMAT, "_ts": _now(), "data": data}
+    lifetime = _upstream_lifetime(r.headers)
+    if lifetime is not None:
+        entry["_max_age"] = lifetime
+    # A 304 may omit validators; keep the ones we already had.
+    for field, header in (("etag", "etag"), ("last_modified", "last-modified")):
+        value = r.headers.get(header) or (previous or {}).get(field)
+        if value:
+            entry[field] = value
+    return entry
+
+
+async def _await_peer(cache_key: str, project: Projector, previous: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Wait out another worker's fetch of cache_key; its entry if it stored a newer one."""
+    store = _get_store()
+    deadline = time.monotonic() + LEASE_SECONDS
+    while store.leased(cache_key) and time.monotonic() < deadline:
+        await asyncio.sleep(PEER_POLL_INTERVAL)
+    entry = _read_projected(cache_key, project)
+    if entry and (not previous or entry["_ts"] > previous["_ts"]):
+        return entry
+    return None
+
+
+async def _fetch_and_store(url: str, cache_key: str, project: Projector) -> Dict[str, Any]:
+    previous = _read_projected(cache_key, project)
+    store = _get_store()
+    if not store.acquire(cache_key, LEASE_SECONDS):
+        # Another worker process is already fetching this key: use its result.
+        shared = await _await_peer(cache_key, project, previous)
+        if shared is not None:
+            if not previous or previous["data"] != shared["data"]:
+                weather_changes.bump()
+            return shared["data"]
+        # It gave up or failed; fetch it ourselves.
+    try:
+        return await _fetch_conditional(url, cache_key, project, previous)
+    finally:
+        store.release(cache_key)
+
+
+async def _fetch_conditional(url: str, cache_key: str, project: Projector, previous: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    headers: Dict[str, str] = {}
+    if previous:
+        if previous.get("etag"):
+            headers["If-None-Match"] = previous["etag"]
+        if previous.get("last_modified"):
+            headers["If-Modified-Since"] = previous["last_modified"]
+
+    r = await _fetch(url, headers)
+    if r.status_code == 304 and previous:
+        # Unchanged upstream: keep the data, just restart its freshness clock.
+        data = previous["data"]
+    else:
+        if r.status_code == 304:
+            r = await _fetch(url)
+        tier = cache_tier(cache_key)
+        metrics.payload_size.observe(r.num_bytes_downloaded, tier)
+        with metrics.parse_duration.time(tier):
+            data = project(r.json())
+    _write_cache(cache_key, _cache_entry(data, r, previous))
+    if not previous or previous["data"] != data or cache_key in _served_stale:
+        weather_changes.bump()
+    _served_stale.discard(cache_key)
+    return data
+
+
+def _refresh(url: str, cache_key: str, project: Projector) -> "asyncio.Task[Dict[str, Any]]":
+    """
+    Start (or join) the upstream fetch for cache_key.
+    Concurrent callers for the same key share one task, so N misses cost one request.
+    """
+    task = _inflight.get(cache_key)
+    if task is None:
+        task = asyncio.create_task(_fetch_and_store(url, cache_key, project))
+        _inflight[cache_key] = task
+        task.add_done_callback(lambda t: _refresh_done(cache_key, t))
+    return task
+
+
+def _refresh_done(cache_key: str, task: "asyncio.Task[Dict[str, Any]]") -> None:
+    if _inflight.get(cache_key) is task:
+        del _inflight[cache_key]
+    if not task.cancelled() and task.exception() is not None:
+        e = task.exception()
+        # An open breaker already logged why; don't repeat it for every key.
+        (log.debug if isinstance(e, CircuitOpenError) else log.warning)("NWS refresh failed for %s: %s", cache_key, e)
+        _note_refresh_failed(cache_key)
+
+
+def _note_refresh_failed(cache_key: str) -> None:
+    """
+    A refresh of cache_key failed. Once its entry is past its TTL, payloads built from
+    it must say so: mark it served stale and announce a change, so cached payloads and
+    stream clients are rebuilt with "stale": true (once per outage, not per retry).
+    """
+    if cache_key in _served_stale or cache_key not in _tracked:
+        return
     cached = _read_cache(cache_key)
-    if cached and isinstance(cached, dict):
-        ts = cached.get("_ts")
-        if isinstance(ts, (int, float)) and (_now() - float(ts)) < ttl_seconds:
-            return cached["data"]
-
-    r = requests.get(url, headers=HEADERS, timeout=15)
-    r.raise_for_status()
-    data = r.json()
-    _write_cache(cache_key, {"_ts": _now(), "data": data})
+    age = _cache_age(cached)
+    if age is not None and age >= _effective_ttl(cached, _tracked[cache_key][1]):
+        _served_stale.add(cache_key)
+        weather_changes.bump()
+
+
+def _read_projected(cache_key: str, project: Projector) -> Optional[Dict[str, Any]]:
+    cached = _read_cache(cache_key)
+    if _cache_age(cached) is None:
+        return None
+    if cached.get("_v") != CACHE_FORMAT:
+        # Entry written by an older version (raw GeoJSON): project it once and rewrite compactly.
+        try:
+            cached = {"_v": CACHE_FORMAT, "_ts": cached["_ts"], "data": project(cached["data"])}
+        except (KeyError, TypeError, ValueError):
+            return None
+        _write_cache(cache_key, cached)
+    return cached
+
+
+async def _cached_get_json(url: str, cache_key: str, ttl_seconds: int, project: Projector) -> Dict[str, Any]:
+    _tracked[cache_key] = (url, ttl_seconds, project, time.monotonic())
+    if _pinning.get():
+        _pinned.add(cache_key)
+
+    sources = _sources.get()
+    cached = _read_projected(cache_key, project)
+    age = _cache_age(cached)
+    if age is not None:
+        stale = age >= _effective_ttl(cached, ttl_seconds)
+        if stale:
+            # Stale-while-revalidate: hand back the last good copy, refresh behind it.
+            metrics.cache_requests.inc(cache_tier(cache_key), "stale")
+            _served_stale.add(cache_key)
+            _refresh(url, cache_key, project)
+        else:
+            metrics.cache_requests.inc(cache_tier(cache_key), "hit")
+        if sources is not None:
+            sources.note(cached["_ts"], stale)
+        return cached["data"]
+
+    metrics.cache_requests.inc(cache_tier(cache_key), "miss")
+    # Nothing on disk yet: wait for the (shared) fetch. shield() keeps one caller's
+    # cancellation (e.g. its request deadline) from killing the fetch others are waiting on.
+    data = await asyncio.shield(_refresh(url, cache_key, project))
+    if sources is not None:
+        sources.note(_now(), False)
     return data
 
 
-def _get_grid_for_point(lat: float, lon: float) -> Grid:
-    url = f"https://api.weather.gov/points/{lat:.4f},{lon:.4f}"
+async def _get_grid_for_point(lat: float, lon: float) -> Grid:
+    url = f"{NWS_BASE_URL}/points/{lat:.4f},{lon:.4f}"
     key = f"nws_points_{lat:.4f}_{lon:.4f}"
-    data = _cached_get_json(url, key, TTL_POINTS)
-    props = data["properties"]
+    data = await _cached_get_json(url, key, TTL_POINTS, _project_points)
     return Grid(
-        grid_id=props["gridId"],
-        grid_x=int(props["gridX"]),
-        grid_y=int(props["gridY"]),
-        time_zone=props.get("timeZone", "UTC"),
+        grid_id=data["gridId"],
+        grid_x=int(data["gridX"]),
+        grid_y=int(data["gridY"]),
+        time_zone=data.get("timeZone", "UTC"),
     )
 
 
 
-def _get_forecast_periods(grid: Grid) -> List[Dict[str, Any]]:
-    url = f"https://api.weather.gov/gridpoints/{grid.grid_id}/{grid.grid_x},{grid.grid_y}/forecast"
+async def _get_forecast_periods(grid: Grid) -> List[Dict[str, Any]]:
+    url = f"{NWS_BASE_URL}/gridpoints/{grid.grid_id}/{grid.grid_x},{grid.grid_y}/forecast"
     key = f"nws_forecast_{grid.grid_id}_{grid.grid_x}_{grid.grid_y}"
-    data = _cached_get_json(url, key, TTL_FORECAST)
-    return data["properties"]["periods"]
+    data = await _cached_get_json(url, key, TTL_FORECAST, _project_forecast)
+    return _periods_from_rows(data)
+
+
+# grid key -> (gridpoint data, hour, forecast periods, hourly rows), for the GRID_VIEWS grids
+# used last. Both views start at the current hour, so they are rebuilt once per refresh and
+# once per hour.
+_gridpoint_views: "OrderedDict[Tuple[str, int, int], Tuple[Dict[str, Any], int, List[Dict[str, Any]], Dict[str, Any]]]" = OrderedDict()
+
+
+async def _get_gridpoint_views(grid: Grid) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Raw mode: (forecast periods, hourly rows) derived from one /gridpoints download."""
+    url = f"{NWS_BASE_URL}/gridpoints/{grid.grid_id}/{grid.grid_x},{grid.grid_y}"
+    key = f"nws_gridpoint_{grid.grid_id}_{grid.grid_x}_{grid.grid_y}"
+    data = await _cached_get_json(url, key, TTL_GRIDPOINT, nws_gridpoints.project)
+    now = _now()
+    hour = int(now) // HOUR
+    cached = _gridpoint_views.get(grid.key)
+    if cached is None or cached[0] is not data or cached[1] != hour:
+        cached = _gridpoint_views[grid.key] = (
+            data,
+            hour,
+            nws_gridpoints.forecast_periods(data, grid.time_zone, now),
+            nws_gridpoints.hourly_rows(data, grid.time_zone, now),
+        )
+    _gridpoint_views.move_to_end(grid.key)
+    while len(_gridpoint_views) > GRID_VIEWS:
+        _gridpoint_views.popitem(last=False)
+    return cached[2], cached[3]
+
+
+async def _get_hourly_rows(grid: Grid) -> Dict[str, Any]:
+    if NWS_GRID_MODE == "raw":
+        return (await _get_gridpoint_views(grid))[1]
+    url = f"{NWS_BASE_URL}/gridpoints/{grid.grid_id}/{grid.grid_x},{grid.grid_y}/forecast/hourly"
+    key = f"nws_hourly_{grid.grid_id}_{grid.grid_x}_{grid.grid_y}"
+    return await _cached_get_json(url, key, TTL_HOURLY, _project_hourly)
 
 
-def _get_hourly_periods(grid: Grid) -> List[Dict[str, Any]]:
-    url = f"https://api.weather.gov/gridpoints/{grid.grid_id}/{grid.grid_x},{grid.grid_y}/forecast/hourly"
-    key = f"nws_hourly_{grid.grid_id}_{grid.grid_x}_{grid.grid_y}"
-    data = _cached_get_json(url, key, TTL_HOURLY)
-    return data["properties"]["periods"]
+async def _get_hourly_periods(grid: Grid) -> List[Dict[str, Any]]:
+    return _periods_from_rows(await _get_hourly_rows(grid))
 
 
 def _first_non_null(*vals):
@@ -149,9 +635,10 @@ def _attire_recommendation(high_f: Optional[int], low_f: Optional[int], precip_p
 
 
 def _precip_from_period(period: Dict[str, Any]) -> Optional[int]:
-    # NWS forecast period often includes probabilityOfPrecipitation { value: int or None }
-    pop = period.get("probabilityOfPrecipitation") or {}
-    val = pop.get("value")
+    # NWS sends probabilityOfPrecipitation { value: int or None }; the cache keeps just the value.
+    val = period.get("probabilityOfPrecipitation")
+    if isinstance(val, dict):
+        val = val.get("value")
     if isinstance(val, (int, float)):
         return int(round(val))
     return None
@@ -244,14 +731,26 @@ def _build_week_from_forecast(periods: List[Dict[str, Any]]) -> List[Dict[str, A
     return days
 
 
-def _city_weather(city: Dict[str, Any], include_week: bool) -> Dict[str, Any]:
-    name = city["name"]
-    lat = float(city["lat"])
-    lon = float(city["lon"])
+async def _grid_periods(grid: Grid) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    if NWS_GRID_MODE == "raw":
+        forecast_periods, hourly_rows = await _get_gridpoint_views(grid)
+        return forecast_periods, _periods_from_rows(hourly_rows)
+    # Forecast and hourly only depend on the grid, so fetch them side by side.
+    forecast_periods, hourly_periods = await asyncio.gather(
+        _get_forecast_periods(grid),
+        _get_hourly_periods(grid),
+    )
+    return forecast_periods, hourly_periods
 
-    grid = _get_grid_for_point(lat, lon)
-    forecast_periods = _get_forecast_periods(grid)
-    hourly_periods = _get_hourly_periods(grid)
+
+def _city_weather(
+    city: Dict[str, Any],
+    grid: Grid,
+    forecast_periods: List[Dict[str, Any]],
+    hourly_periods: List[Dict[str, Any]],
+    include_week: bool,
+) -> Dict[str, Any]:
+    name = city["name"]
 
     # Current: take the first hourly period
     cur = hourly_periods[0] if hourly_periods else {}
@@ -301,19 +800,269 @@ def _city_weather(city: Dict[str, Any], include_week: bool) -> Dict[str, Any]:
     return out
 
 
-def get_weather_payload() -> Dict[str, Any]:
-    if not CITIES:
-        return {"primary": None, "others": [], "updated_at": int(_now())}
+async def _build_payload(cities: Sequence[Dict[str, Any]]) -> Build:
+    """The payload for `cities`, plus the fetch time of the oldest cache entry it used."""
+    sources = _Sources()
+    # Tasks started below copy this context, so every lookup reports to the same object.
+    _sources.set(sources)
 
-    primary_city = CITIES[0]
-    other_cities = CITIES[1:]
+    # Resolve every city to its grid, then fetch each distinct grid once. Every step
+    # runs concurrently, so a cold start costs the slowest chain rather than the sum.
+    grids = await asyncio.gather(*(_get_grid_for_point(float(c["lat"]), float(c["lon"])) for c in cities))
+    unique = {g.key: g for g in grids}
+    periods = dict(zip(unique, await asyncio.gather(*(_grid_periods(g) for g in unique.values()))))
 
-    primary = _city_weather(primary_city, include_week=True)
-    others = [_city_weather(c, include_week=False) for c in other_cities]
+    primary, *others = [
+        _city_weather(c, g, *periods[g.key], include_week=(i == 0))
+        for i, (c, g) in enumerate(zip(cities, grids))
+    ]
 
-    return {
+    now = _now()
+    oldest = sources.oldest if sources.oldest is not None else now
+    return oldest, {
         "primary": primary,
         "others": others,
-        "updated_at": int(_now()),
+        "updated_at": int(now),
+        "source": "api.weather.gov",
+        # True when some of the data is past its TTL (NWS has not answered a refresh yet)
+        "stale": sources.stale,
+        "age_seconds": round(now - oldest, 1),
+    }
+
+
+async def get_weather_payload(
+    cities: Optional[Sequence[Dict[str, Any]]] = None,
+    deadline: Optional[float] = REQUEST_DEADLINE,
+) -> Dict[str, Any]:
+    """
+    Weather for `cities` (default CITIES; the first one is the primary city).
+    Cities that fall on the same NWS grid share one forecast and one hourly lookup.
+
+    Waits at most `deadline` seconds. If that runs out, or NWS's breaker is open, the
+    last good payload for the same cities is returned with "stale": true, or
+    WeatherUnavailable is raised if there is none. A build that misses the deadline
+    keeps running, so the next request finds it done.
+    """
+    if cities is None:
+        cities = CITIES
+    if not cities:
+        return {"primary": None, "others": [], "updated_at": int(_now())}
+
+    return await _await_build(cities_key(cities), lambda: _build_payload(cities), deadline)
+
+
+async def _await_build(key: BuildKey, build: Callable[[], Awaitable[Build]], deadline: Optional[float]) -> Dict[str, Any]:
+    """
+    The payload from the build for `key`, started (or joined) here, waiting at most
+    `deadline` seconds. Past it, or while NWS's breaker is open, the last good payload
+    for `key` is returned marked stale, or WeatherUnavailable is raised if there is none.
+    """
+    try:
+        _, payload = await asyncio.wait_for(asyncio.shield(_start_build(key, build)), deadline)
+    except (asyncio.TimeoutError, CircuitOpenError, httpx.HTTPError) as e:
+        if key not in _last_good:
+            raise WeatherUnavailable(str(e) or "NWS did not answer in time") from e
+        oldest, payload = _last_good[key]
+        return {**payload, "stale": True, "age_seconds": round(_now() - oldest, 1)}
+    return payload
+
+
+def _start_build(key: BuildKey, build: Callable[[], Awaitable[Build]]) -> "asyncio.Task[Build]":
+    """Start (or join) the payload build for a variant."""
+    task = _building.get(key)
+    if task is None:
+        task = asyncio.create_task(build())
+        _building[key] = task
+        task.add_done_callback(lambda t: _build_done(key, t))
+    return task
+
+
+def _build_done(key: BuildKey, task: "asyncio.Task[Build]") -> None:
+    if _building.get(key) is task:
+        del _building[key]
+    # exception() also marks a failure as retrieved when every waiter already timed out.
+    if task.cancelled() or task.exception() is not None:
+        return
+    _last_good[key] = task.result()
+    _last_good.move_to_end(key)
+    while len(_last_good) > LAST_GOOD_PAYLOADS:
+        _last_good.popitem(last=False)
+
+
+# -----------------------------
+# Hourly timeline (columnar)
+# -----------------------------
+# grid key -> (hourly data dict as cached, its timeline), for the GRID_VIEWS grids used last.
+# A refresh replaces the data object, so each timeline is computed once per refresh.
+_timelines: "OrderedDict[Tuple[str, int, int], Tuple[Dict[str, Any], Dict[str, Any]]]" = OrderedDict()
+
+
+def _wind_mph(text: Any) -> Optional[int]:
+    # "10 mph" or "5 to 10 mph"; take the upper end
+    nums = re.findall(r"\d+", text) if isinstance(text, str) else ()
+    return int(nums[-1]) if nums else None
+
+
+def _as_int(v: Any) -> Optional[int]:
+    return int(round(v)) if isinstance(v, (int, float)) else None
+
+
+def _hourly_timeline(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Turn cached hourly rows into parallel series on a fixed hourly grid:
+    {"start": epoch of the first hour, "temperature_f": [...], "precip_pct": [...], ...}.
+    Hours missing from the feed are null.
+    """
+    columns = dict(zip(data["fields"], zip(*data["rows"]))) if data["rows"] else {}
+    if not columns:
+        return {"start": None, "temperature_f": [], "precip_pct": [], "wind_mph": [], "cloud_pct": []}
+
+    starts = [int(datetime.fromisoformat(t).timestamp()) for t in columns["startTime"]]
+    series = {
+        "temperature_f": [_as_int(v) for v in columns["temperature"]],
+        "precip_pct": [_as_int(v) for v in columns["probabilityOfPrecipitation"]],
+        "wind_mph": [_wind_mph(v) for v in columns["windSpeed"]],
+        "cloud_pct": [_as_int(v) for v in columns["cloudCover"]],
+    }
+
+    start = starts[0]
+    slots = [(t - start) // HOUR for t in starts]
+    if slots != list(range(len(slots))):
+        # Gaps or repeats in the feed: lay the values out on the hourly grid.
+        size = max(slots) + 1
+        for name, values in series.items():
+            placed: List[Optional[int]] = [None] * size
+            for slot, v in zip(slots, values):
+                if slot >= 0:
+                    placed[slot] = v
+            series[name] = placed
+    return {"start": start, **series}
+
+
+def _timeline_for(grid: Grid, data: Dict[str, Any]) -> Dict[str, Any]:
+    cached = _timelines.get(grid.key)
+    if cached is None or cached[0] is not data:
+        cached = _timelines[grid.key] = (data, _hourly_timeline(data))
+    _timelines.move_to_end(grid.key)
+    while len(_timelines) > GRID_VIEWS:
+        _timelines.popitem(last=False)
+    return cached[1]
+
+
+def _timeline_window(timeline: Dict[str, Any], hours: int, step: int) -> Dict[str, Any]:
+    """The next `hours` hours from the current hour, keeping every `step`-th hour."""
+    start = timeline["start"]
+    offset = max(0, int(_now() - start) // HOUR) if start is not None else 0
+    window = slice(offset, offset + hours, step)
+    return {
+        "start": start + offset * HOUR if start is not None else None,
+        "step": step * HOUR,
+        **{name: timeline[name][window] for name in ("temperature_f", "precip_pct", "wind_mph", "cloud_pct")},
+    }
+
+
+async def _build_hourly(cities: Sequence[Dict[str, Any]], hours: int, step: int) -> Build:
+    sources = _Sources()
+    _sources.set(sources)
+
+    grids = await asyncio.gather(*(_get_grid_for_point(float(c["lat"]), float(c["lon"])) for c in cities))
+    unique = {g.key: g for g in grids}
+    rows = dict(zip(unique, await asyncio.gather(*(_get_hourly_rows(g) for g in unique.values()))))
+
+    now = _now()
+    oldest = sources.oldest if sources.oldest is not None else now
+    return oldest, {
+        "cities": [
+            {"name": c["name"], "timeZone": g.time_zone, **_timeline_window(_timeline_for(g, rows[g.key]), hours, step)}
+            for c, g in zip(cities, grids)
+        ],
+        "updated_at": int(now),
         "source": "api.weather.gov",
+        "stale": sources.stale,
+        "age_seconds": round(now - oldest, 1),
     }
+
+
+async def get_hourly_payload(
+    cities: Optional[Sequence[Dict[str, Any]]] = None,
+    hours: int = HOURLY_DEFAULT_HOURS,
+    step: int = 1,
+    deadline: Optional[float] = REQUEST_DEADLINE,
+) -> Dict[str, Any]:
+    """
+    Hourly temperature, precipitation, wind and cloud series for `cities`, as parallel
+    arrays starting at the current hour, one value per `step` hours.
+
+    Deadline and fallback work as in get_weather_payload: past `deadline`, or while
+    NWS's breaker is open, the last good series for the same request is returned
+    with "stale": true, or WeatherUnavailable is raised if there is none.
+    """
+    if cities is None:
+        cities = CITIES
+    hours = max(1, min(hours, HOURLY_MAX_HOURS))
+    step = max(1, min(step, hours))
+    key = ("hourly", cities_key(cities), hours, step)
+    return await _await_build(key, lambda: _build_hourly(cities, hours, step), deadline)
+
+
+async def _refresh_due_keys() -> None:
+    due = []
+    idle_before = time.monotonic() - TRACK_IDLE_SECONDS
+    for cache_key, (url, ttl, project, requested) in list(_tracked.items()):
+        if requested < idle_before and cache_key not in _pinned:
+            # Only ever asked for by an ad-hoc city list nobody is showing any more.
+            del _tracked[cache_key]
+            continue
+        cached = _read_cache(cache_key)
+        age = _cache_age(cached)
+        ttl = _effective_ttl(cached, ttl)
+        if age is None or age >= ttl - min(REFRESH_MARGIN, ttl / 2):
+            due.append(_refresh(url, cache_key, project))
+    if due:
+        await asyncio.gather(*due, return_exceptions=True)
+
+
+async def _warm_profiles(profiles: Dict[str, List[Dict[str, Any]]]) -> None:
+    """Build each profile's payload with pinning on; drops the ones that succeeded from `profiles`."""
+    token = _pinning.set(True)
+    try:
+        for name, cities in list(profiles.items()):
+            try:
+                await get_weather_payload(cities, deadline=None)
+            except Exception as e:
+                log.warning("NWS warm-up failed for profile %s: %s", name, e)
+            else:
+                del profiles[name]
+    finally:
+        _pinning.reset(token)
+
+
+async def run_refresher() -> None:
+    """
+    Background loop (started by the app) that keeps every cache key in use warm:
+    each key is refetched shortly before its TTL runs out, so requests never wait on NWS.
+    It also trims the cache store once per EVICT_INTERVAL.
+    """
+    last_evict = 0.0
+    # Build every configured profile once so its keys get tracked and pinned, and a cold
+    # cache is warm before the first request. Profiles that fail are retried each pass.
+    unwarmed = dict(PROFILES)
+    await _warm_profiles(unwarmed)
+
+    while True:
+        await asyncio.sleep(REFRESH_INTERVAL)
+        if unwarmed:
+            await _warm_profiles(unwarmed)
+        try:
+            await _refresh_due_keys()
+        except Exception as e:
+            log.warning("NWS refresh pass failed: %s", e)
+        if time.monotonic() - last_evict >= EVICT_INTERVAL:
+            last_evict = time.monotonic()
+            try:
+                removed = _get_store().evict()
+            except Exception as e:
+                log.warning("NWS cache eviction failed: %s", e)
+            else:
+                if removed:
+                    log.info("Evicted %d NWS cache entries", removed)
@@ -0,0 +1,91 @@
+"""
+Pre-encoded JSON responses.
+
+Payloads are serialized (and gzipped) once per data generation and then served
+as bytes with a strong ETag, so a poll whose data has not changed is a hash
+compare and an empty 304.
+"""
+import gzip
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional
+
+from fastapi import Request, Response
+
+from . import metrics
+
+# Below this size gzip costs more than it saves
+GZIP_MIN_BYTES = 1024
+
+
+@dataclass(frozen=True)
+class EncodedPayload:
+    body: bytes
+    gzipped: Optional[bytes]
+    etag: str
+
+
+def encode_payload(data: Any) -> EncodedPayload:
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    gzipped = gzip.compress(body, compresslevel=6, mtime=0) if len(body) >= GZIP_MIN_BYTES else None
+    etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+    return EncodedPayload(body, gzipped, etag)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def accepts_encoding(request: Request, coding: str) -> bool:
+    accept = request.headers.get("accept-encoding", "")
+    for part in accept.split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() == coding and params.replace(" ", "") != "q=0":
+            return True
+    return False
+
+
+def payload_response(request: Request, payload: EncodedPayload, cache_control: str = "no-cache") -> Response:
+    headers = {"ETag": payload.etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), payload.etag):
+        return Response(status_code=304, headers=headers)
+    body = payload.body
+    if payload.gzipped is not None and accepts_encoding(request, "gzip"):
+        body = payload.gzipped
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+class PayloadCache:
+    """
+    Encoded payloads for the current data generation, keyed by request variant
+    (query parameters). Moving to a new generation drops every entry.
+    """
+
+    def __init__(self, name: str, max_entries: int = 64) -> None:
+        self.name = name
+        self.max_entries = max_entries
+        self._generation: Hashable = None
+        self._entries: Dict[Hashable, EncodedPayload] = {}
+
+    def lookup(self, generation: Hashable, key: Hashable = None) -> Optional[EncodedPayload]:
+        encoded = self._entries.get(key) if generation == self._generation else None
+        metrics.payload_cache_requests.inc(self.name, "miss" if encoded is None else "hit")
+        return encoded
+
+    def store(self, generation: Hashable, key: Hashable, data: Any) -> EncodedPayload:
+        encoded = encode_payload(data)
+        if generation != self._generation:
+            self._generation = generation
+            self._entries = {}
+        if len(self._entries) >= self.max_entries:
+            self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = encoded
+        return encoded
@@ -0,0 +1,131 @@
+"""
+Static frontend delivery.
+
+Every file in the frontend directory is read into memory with a content hash,
+a gzip copy and (when the optional `brotli` package is installed) a brotli copy.
+index.html is rewritten to point at content-hashed URLs (/static/app.<hash>.js).
+Those URLs never change content, so they are served as immutable. index.html and
+unhashed names are revalidated through their ETag instead.
+
+Files are re-read when their mtime changes, so editing the frontend and
+reloading the kiosk still works without restarting the backend.
+"""
+import gzip
+import hashlib
+import mimetypes
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response
+
+from .responses import accepts_encoding, etag_matches
+
+try:
+    import brotli
+except ImportError:  # optional: gzip alone is fine
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+COMPRESSIBLE = {".html", ".js", ".css", ".svg", ".json", ".txt"}
+
+# href="/static/x" or src='/static/x' in index.html
+_STATIC_REF = re.compile(r'(["\'])/static/([^"\'?#]+)\1')
+
+
+@dataclass(frozen=True)
+class Asset:
+    body: bytes
+    media_type: str
+    etag: str
+    digest: str
+    gzipped: Optional[bytes] = None
+    brotli: Optional[bytes] = None
+
+
+def _hashed_name(name: str, digest: str) -> str:
+    stem, dot, ext = name.rpartition(".")
+    return f"{stem}.{digest}.{ext}" if dot else f"{name}.{digest}"
+
+
+def _build_asset(body: bytes, suffix: str, name: str) -> Asset:
+    digest = hashlib.blake2b(body, digest_size=6).hexdigest()
+    media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type in ("application/javascript", "application/json"):
+        media_type += "; charset=utf-8"
+    gz = br = None
+    if suffix in COMPRESSIBLE:
+        gz = gzip.compress(body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            br = brotli.compress(body, quality=11)
+    return Asset(body, media_type, f'"{digest}"', digest, gz, br)
+
+
+class StaticBundle:
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self._mtimes: Dict[str, int] = {}
+        self._assets: Dict[str, Asset] = {}
+        # public URL name -> (file name, immutable?)
+        self._routes: Dict[str, Tuple[str, bool]] = {}
+
+    def _scan(self) -> None:
+        mtimes = {p.name: p.stat().st_mtime_ns for p in self.root.iterdir() if p.is_file()}
+        if mtimes == self._mtimes:
+            return
+
+        assets = {}
+        for name in mtimes:
+            if name == "index.html":
+                continue
+            p = self.root / name
+            prev = self._assets.get(name)
+            if prev is not None and self._mtimes.get(name) == mtimes[name]:
+                assets[name] = prev
+            else:
+                assets[name] = _build_asset(p.read_bytes(), p.suffix.lower(), name)
+
+        routes = {name: (name, False) for name in assets}
+        routes.update({_hashed_name(name, a.digest): (name, True) for name, a in assets.items()})
+
+        if "index.html" in mtimes:
+            html = (self.root / "index.html").read_text(encoding="utf-8")
+
+            def rewrite(m: "re.Match[str]") -> str:
+                name = m.group(2)
+                if name not in assets:
+                    return m.group(0)
+                return f"{m.group(1)}/static/{_hashed_name(name, assets[name].digest)}{m.group(1)}"
+
+            assets["index.html"] = _build_asset(_STATIC_REF.sub(rewrite, html).encode("utf-8"), ".html", "index.html")
+            routes["index.html"] = ("index.html", False)
+
+        self._assets, self._routes, self._mtimes = assets, routes, mtimes
+
+    def response(self, request: Request, url_name: str) -> Response:
+        self._scan()
+        route = self._routes.get(url_name)
+        if route is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        name, immutable = route
+        asset = self._assets[name]
+
+        headers = {
+            "ETag": asset.etag,
+            "Cache-Control": IMMUTABLE if immutable else REVALIDATE,
+        }
+        if asset.gzipped is not None:
+            headers["Vary"] = "Accept-Encoding"
+        if etag_matches(request.headers.get("if-none-match"), asset.etag):
+            return Response(status_code=304, headers=headers)
+
+        body = asset.body
+        if asset.brotli is not None and accepts_encoding(request, "br"):
+            body = asset.brotli
+            headers["Content-Encoding"] = "br"
+        elif asset.gzipped is not None and accepts_encoding(request, "gzip"):
+            body = asset.gzipped
+            headers["Content-Encoding"] = "gzip"
+        return Response(content=body, media_type=asset.media_type, headers=headers)
@@ -0,0 +1,80 @@
+"""
+Server-Sent Events stream for the dashboard.
+
+One connection carries two event types:
+- `weather`: the full /api/weather payload, sent when the cached NWS data changes
+- `transit`: a /api/transit/vehicles response, sent as a delta when the fleet changes
+
+Every event id is "<weather version>.<transit version>", so a reconnecting browser
+(Last-Event-ID) only gets what it missed. A `heartbeat` event goes out when nothing
+has changed for HEARTBEAT_SECONDS, so clients can tell a quiet stream from a dead one.
+"""
+import json
+from contextlib import suppress
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import Request
+
+from .providers.changes import wait_any
+from .providers.spatial import BBox
+from .providers.transit_sdmts import get_vehicle_positions, transit_changes
+from .providers.weather_nws import get_weather_payload, weather_changes
+
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 5000
+
+
+def _parse_event_id(last_event_id: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    try:
+        weather, transit = (last_event_id or "").split(".", 1)
+        return int(weather), int(transit)
+    except ValueError:
+        return None, None
+
+
+def _event_id(weather_seen: Optional[int], transit_seen: Optional[int]) -> str:
+    # 0 is never a real version, so a resume from it resends everything.
+    return f"{weather_seen or 0}.{transit_seen or 0}"
+
+
+def _event(name: str, data: Any, event_id: Optional[str] = None) -> str:
+    lines = [f"event: {name}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def event_stream(
+    request: Request,
+    last_event_id: Optional[str],
+    bbox: Optional[BBox] = None,
+    cities: Optional[List[Dict[str, Any]]] = None,
+) -> AsyncIterator[str]:
+    weather_seen, transit_seen = _parse_event_id(last_event_id)
+    yield f"retry: {RETRY_MS}\n\n"
+
+    while not await request.is_disconnected():
+        if weather_changes.version != weather_seen:
+            # Read the version first: a change landing mid-build is picked up next loop.
+            weather_seen = weather_changes.version
+            try:
+                payload = await get_weather_payload(cities)
+            except Exception:
+                # NWS unreachable with nothing cached; try again on the next change.
+                payload = None
+            if payload is not None:
+                yield _event("weather", payload, _event_id(weather_seen, transit_seen))
+
+        if transit_changes.version != transit_seen:
+            update = get_vehicle_positions(since=transit_seen, bbox=bbox)
+            transit_seen = update["version"]
+            yield _event("transit", update, _event_id(weather_seen, transit_seen))
+
+        feeds = ((weather_changes, weather_seen), (transit_changes, transit_seen))
+        if not await wait_any(feeds, HEARTBEAT_SECONDS):
+            if cities is not None:
+                # Keeps this stream's grids marked as in use, so the refresher keeps them warm.
+                with suppress(Exception):
+                    await get_weather_payload(cities)
+            yield _event("heartbeat", {})
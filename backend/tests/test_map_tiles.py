@@ -0,0 +1,43 @@
+import asyncio
+import threading
+
+from app.providers import map_tiles
+
+
+def test_evicts_to_low_water_mark(tmp_path, monkeypatch):
+    store = map_tiles.TileStore(tmp_path / "tiles.mbtiles", max_bytes=1000)
+    evictions = []
+    evict = store.evict
+    monkeypatch.setattr(store, "evict", lambda: evictions.append(evict()))
+    try:
+        for x in range(11):
+            store.put(12, x, 0, bytes(100), f'"{x}"')
+        # Over the cap once: the oldest tiles go until 90% of it is left
+        assert evictions == [2]
+        assert store.get(12, 0, 0) is None and store.get(12, 1, 0) is None
+        assert store.get(12, 10, 0) is not None
+
+        # The headroom absorbs the next tile without another eviction
+        store.put(12, 11, 0, bytes(100), '"11"')
+        assert evictions == [2]
+    finally:
+        store.close()
+
+
+def test_get_tile_reads_store_off_event_loop(tmp_path, monkeypatch):
+    store = map_tiles.TileStore(tmp_path / "tiles.mbtiles")
+    monkeypatch.setattr(map_tiles, "_store", store)
+    stored = store.put(12, 1, 2, b"png", '"a"')
+    threads = []
+    get = store.get
+
+    def recording_get(z, x, y):
+        threads.append(threading.current_thread())
+        return get(z, x, y)
+
+    monkeypatch.setattr(store, "get", recording_get)
+    try:
+        assert asyncio.run(map_tiles.get_tile(12, 1, 2)) == stored
+        assert threads and threads[0] is not threading.main_thread()
+    finally:
+        store.close()
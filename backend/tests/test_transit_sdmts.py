@@ -0,0 +1,195 @@
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.providers import transit_sdmts
+from app.responses import PayloadCache
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+# bench/ (at the repo root) builds the synthetic feeds in both wire formats
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from bench.fixtures import _f32, _key, _len, _str, _varint, make_pbtext_feed, make_protobuf_feed  # noqa: E402
+
+# What the hand-written sample feed holds:
+# (id, vehicle_id, route_id, trip_id, latitude, longitude, timestamp, vehicle_type)
+SAMPLE_VEHICLES = [
+    ("141", "2014", "5", "19098388", 32.71145, -117.10533, 1771373814, "bus"),
+    ("3127", "4021", "510", "19112040", 32.7114, -117.15938, 1771373809, "trolley"),
+    ("3502", "5003", "532", "19115573", 32.71581, -117.16247, 1771373795, "trolley"),
+    ("208", "1817", "unknown", "19101777", 32.76744, -117.06926, 1771373780, "bus"),
+    # Fields out of the usual order, several per line; the entity id comes last
+    ("610", "2203", "12", "19107712", 32.74003, -117.12611, 1771373811, "bus"),
+]
+
+
+@pytest.fixture(scope="module")
+def sample_pbtext() -> str:
+    return (DATA_DIR / "sdmts_vehicle_positions_sample.pbtext").read_text()
+
+
+def _summary(vehicles):
+    return [
+        (v["id"], v["vehicle_id"], v["route_id"], v["trip_id"], v["latitude"], v["longitude"], v["timestamp"], v["vehicle_type"])
+        for v in vehicles
+    ]
+
+
+def test_parse_pbtext_sample_feed(sample_pbtext):
+    vehicles = transit_sdmts.parse_pbtext_response(sample_pbtext)
+    # Entity 999 has no position and is skipped
+    assert _summary(vehicles) == SAMPLE_VEHICLES
+    assert vehicles[1]["trolley_line"] == "Blue"
+    assert vehicles[2]["trolley_line"] == "Green"
+    assert vehicles[0]["trolley_line"] is None
+
+
+@pytest.mark.parametrize("size", [1, 7, 64, 4096])
+def test_parse_pbtext_streamed_in_chunks(sample_pbtext, size):
+    chunks = (sample_pbtext[i:i + size] for i in range(0, len(sample_pbtext), size))
+    assert transit_sdmts.parse_pbtext_response(chunks) == transit_sdmts.parse_pbtext_response(sample_pbtext)
+
+
+def test_parse_pbtext_ids_by_nesting():
+    text = (
+        'entity {\n'
+        '  vehicle {\n'
+        '    vehicle {\n'
+        '      id: "7001"\n'
+        '    }\n'
+        '    position {\n'
+        '      latitude: 32.7\n'
+        '      longitude: -117.1\n'
+        '    }\n'
+        '  }\n'
+        '  id: "42"\n'
+        '}\n'
+    )
+    [vehicle] = transit_sdmts.parse_pbtext_response(text)
+    assert vehicle["id"] == "42"
+    assert vehicle["vehicle_id"] == "7001"
+
+
+ENTITY_141 = (
+    'entity {\n'
+    '  id: "141"\n'
+    '  vehicle {\n'
+    '    trip {\n'
+    '      trip_id: "19098388"\n'
+    '      route_id: "5"\n'
+    '    }\n'
+    '    position {\n'
+    '      latitude: 32.71145\n'
+    '      longitude: -117.10533\n'
+    '    }\n'
+    '    timestamp: 1771373814\n'
+    '    vehicle {\n'
+    '      id: "2014"\n'
+    '    }\n'
+    '  }\n'
+    '}\n'
+)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        # Unknown scalar fields after the known ones, an [extension] and a comment
+        ENTITY_141.replace('      id: "2014"\n', '      id: "2014"\n      [ext.depot]: "IAD"\n').replace("  }\n}", "  }\n  # end\n}"),
+        # Known fields out of order, and a message opened with "name: {"
+        ENTITY_141.replace('      trip_id: "19098388"\n      route_id: "5"', '      route_id: "5"\n      trip_id: "19098388"')
+        .replace("position {", "position: {"),
+        " ".join(ENTITY_141.split()),
+    ],
+)
+def test_parse_pbtext_layouts(text):
+    assert transit_sdmts.parse_pbtext_response(text) == transit_sdmts.parse_pbtext_response(ENTITY_141)
+
+
+def test_parse_pbtext_skips_deleted_entities():
+    deleted = ENTITY_141.replace('  id: "141"\n', '  id: "141"\n  is_deleted: true\n')
+    assert transit_sdmts.parse_pbtext_response(deleted + ENTITY_141.replace('"141"', '"142"'))[0]["id"] == "142"
+    assert transit_sdmts.parse_pbtext_response(deleted) == []
+
+
+def test_parse_pbtext_escaped_strings():
+    [vehicle] = transit_sdmts.parse_pbtext_response(ENTITY_141.replace('id: "2014"', 'id: "20\\"14"'))
+    assert vehicle["vehicle_id"] == '20\\"14'
+    assert vehicle["route_id"] == "5"
+
+
+def test_parse_feed_message_matches_pbtext():
+    decoded = transit_sdmts.parse_feed_message(make_protobuf_feed(200))
+    parsed = transit_sdmts.parse_pbtext_response(make_pbtext_feed(200))
+    assert len(decoded) == len(parsed) == 200
+    for got, want in zip(decoded, parsed):
+        # Coordinates travel as float32 and are rounded to 6 decimals
+        assert got["latitude"] == pytest.approx(want["latitude"], abs=1e-5)
+        assert got["longitude"] == pytest.approx(want["longitude"], abs=1e-5)
+        assert {**got, "latitude": 0, "longitude": 0} == {**want, "latitude": 0, "longitude": 0}
+
+
+def _entity(entity_id: str, *fields: bytes) -> bytes:
+    vehicle = _len(2, _f32(1, 32.71) + _f32(2, -117.16)) + _key(5, 0) + _varint(1771373800)
+    return _len(2, _str(1, entity_id) + b"".join(fields) + _len(4, vehicle))
+
+
+def test_parse_feed_message_skips_deleted_entities():
+    feed = _entity("1", _key(2, 0) + _varint(1)) + _entity("2", _key(2, 0) + _varint(0)) + _entity("3")
+    assert [v["id"] for v in transit_sdmts.parse_feed_message(feed)] == ["2", "3"]
+
+
+def test_parse_feed_message_truncated():
+    feed = make_protobuf_feed(3)
+    for cut in (1, 10, len(feed) // 2, len(feed) - 1):
+        with pytest.raises(ValueError):
+            transit_sdmts.parse_feed_message(feed[:cut])
+
+
+def test_parse_feed_message_overlong_lengths():
+    feed = make_protobuf_feed(3)
+    # An entity whose length runs past the end of the feed
+    with pytest.raises(ValueError):
+        transit_sdmts.parse_feed_message(feed + _key(2, 2) + _varint(1000) + b"entity")
+    # A length prefix longer than any varint
+    with pytest.raises(ValueError):
+        transit_sdmts.parse_feed_message(feed + _key(2, 2) + b"\xff" * 11 + b"\x01")
+    # A field overrunning its entity drops that entity only
+    bad = _len(2, _str(1, "bad") + _key(4, 2) + _varint(50) + b"short")
+    assert len(transit_sdmts.parse_feed_message(bad + feed)) == 3
+
+
+@pytest.mark.parametrize(
+    "route_id, line",
+    [("510", "Blue"), ("520", "Orange"), ("530", "Green"), ("532", "Green"), ("540", "Copper"), ("599", "Trolley")],
+)
+def test_trolley_line_from_route(route_id, line):
+    assert transit_sdmts._trolley_line_from_route(route_id) == line
+
+
+def test_vehicles_endpoint_ages_while_polls_fail(sample_pbtext, monkeypatch):
+    clock = [1771373820.0]
+    monkeypatch.setattr(
+        transit_sdmts, "time", SimpleNamespace(time=lambda: clock[0], monotonic=time.monotonic, perf_counter=time.perf_counter)
+    )
+    monkeypatch.setattr(transit_sdmts, "_snapshot", transit_sdmts.current_snapshot())
+    monkeypatch.setattr(transit_sdmts, "_history", transit_sdmts.OrderedDict())
+    monkeypatch.setattr(main, "transit_payloads", PayloadCache("transit"))
+    client = TestClient(main.app)
+
+    transit_sdmts._publish({"success": True, "vehicles": transit_sdmts.parse_pbtext_response(sample_pbtext)})
+    transit_sdmts._publish({"success": False, "error": "HTTP 503"})
+    failing = client.get("/api/transit/vehicles").json()
+    assert (failing["age_seconds"], failing["stale"], failing["error"]) == (0.0, False, "HTTP 503")
+
+    # Polls keep failing the same way while the last good fleet ages
+    clock[0] += 600
+    transit_sdmts._publish({"success": False, "error": "HTTP 503"})
+    served = client.get("/api/transit/vehicles").json()
+    assert (served["age_seconds"], served["stale"]) == (600.0, True)
+    assert served["count"] == len(SAMPLE_VEHICLES)
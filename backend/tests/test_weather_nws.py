@@ -0,0 +1,93 @@
+import asyncio
+import shutil
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.providers import weather_nws
+from app.responses import PayloadCache
+
+# NWS responses recorded into the repo's cache/ directory
+RECORDED_CACHE = Path(__file__).resolve().parents[2] / "cache"
+
+
+@pytest.fixture
+def clock(tmp_path, monkeypatch):
+    """A scratch copy of the recorded cache, with weather_nws's clock frozen at recording time."""
+    for p in RECORDED_CACHE.glob("nws_*.json"):
+        shutil.copy(p, tmp_path)
+    monkeypatch.setattr(weather_nws, "CACHE_DIR", tmp_path)
+    for name, value in (
+        ("_store", None),
+        ("_tracked", {}),
+        ("_pinned", set()),
+        ("_served_stale", set()),
+        ("_inflight", {}),
+        ("_building", {}),
+        ("_last_good", weather_nws.OrderedDict()),
+    ):
+        monkeypatch.setattr(weather_nws, name, value)
+    monkeypatch.setattr(main, "weather_payloads", PayloadCache("weather"))
+
+    now = [max(weather_nws._read_cache(p.stem)["_ts"] for p in tmp_path.glob("nws_*.json")) + 1]
+    monkeypatch.setattr(weather_nws, "_now", lambda: now[0])
+    yield now
+    weather_nws._get_store().close()
+
+
+async def _unreachable(url, headers=None):
+    raise httpx.ConnectError("NWS is down")
+
+
+def test_weather_marked_stale_when_refresh_fails(clock, monkeypatch):
+    client = TestClient(main.app)
+    fresh = client.get("/api/weather").json()
+    assert fresh["stale"] is False
+
+    # NWS goes down and the refresher keeps failing well past every TTL
+    monkeypatch.setattr(weather_nws, "_fetch", _unreachable)
+    version = weather_nws.weather_changes.version
+    clock[0] += 2 * 3600
+    asyncio.run(weather_nws._refresh_due_keys())
+    assert weather_nws.weather_changes.version > version
+
+    served = client.get("/api/weather").json()
+    assert served["stale"] is True
+    assert served["age_seconds"] >= 2 * 3600
+    assert served["primary"] == fresh["primary"]
+
+    # Retries during the same outage don't announce a change again
+    version = weather_nws.weather_changes.version
+    asyncio.run(weather_nws._refresh_due_keys())
+    assert weather_nws.weather_changes.version == version
+
+
+def test_timelines_bounded(monkeypatch):
+    monkeypatch.setattr(weather_nws, "_timelines", weather_nws.OrderedDict())
+    data = {"fields": ["startTime"], "rows": []}
+    grids = [weather_nws.Grid("SGX", x, 1, "America/Los_Angeles") for x in range(weather_nws.GRID_VIEWS + 5)]
+    for grid in grids:
+        weather_nws._timeline_for(grid, data)
+    weather_nws._timeline_for(grids[5], data)
+    assert len(weather_nws._timelines) == weather_nws.GRID_VIEWS
+    assert list(weather_nws._timelines)[-1] == grids[5].key
+    assert grids[0].key not in weather_nws._timelines
+
+
+def test_gridpoint_views_bounded(monkeypatch):
+    gridpoint = weather_nws.nws_gridpoints.project({"properties": {"validTimes": "2024-01-01T00:00:00+00:00/PT1H"}})
+
+    async def cached_gridpoint(url, key, ttl, project):
+        return gridpoint
+
+    monkeypatch.setattr(weather_nws, "_gridpoint_views", weather_nws.OrderedDict())
+    monkeypatch.setattr(weather_nws, "_cached_get_json", cached_gridpoint)
+    grids = [weather_nws.Grid("SGX", x, 1, "America/Los_Angeles") for x in range(weather_nws.GRID_VIEWS + 5)]
+    for grid in grids + [grids[5]]:
+        asyncio.run(weather_nws._get_gridpoint_views(grid))
+    assert len(weather_nws._gridpoint_views) == weather_nws.GRID_VIEWS
+    assert list(weather_nws._gridpoint_views)[-1] == grids[5].key
+    assert grids[0].key not in weather_nws._gridpoint_views
@@ -0,0 +1,43 @@
+"""
+The SDMTS pbtext parser as it stood before the transit work, kept as a fixed
+reference point for bench.micro: one regex search per field over each block
+split on `entity {`. Not used by the app.
+"""
+import re
+from typing import Any, Dict, List
+
+TROLLEY_ROUTES = {"510", "520", "530", "532"}
+TROLLEY_LINES = {"510": "Blue", "520": "Orange", "530": "Green", "540": "Copper"}
+
+
+def parse_pbtext_response(text: str) -> List[Dict[str, Any]]:
+    vehicles = []
+    for block in re.split(r'entity\s*{', text)[1:]:
+        try:
+            entity_id_match = re.search(r'id:\s*"([^"]+)"', block)
+            if not entity_id_match:
+                continue
+            route_id_match = re.search(r'route_id:\s*"([^"]+)"', block)
+            route_id = route_id_match.group(1) if route_id_match else "unknown"
+            lat_match = re.search(r'latitude:\s*([-\d.]+)', block)
+            if not lat_match:
+                continue
+            lon_match = re.search(r'longitude:\s*([-\d.]+)', block)
+            if not lon_match:
+                continue
+            vehicle_id_match = re.search(r'vehicle\s*{\s*id:\s*"([^"]+)"', block)
+            timestamp_match = re.search(r'timestamp:\s*(\d+)', block)
+            vehicle_type = "trolley" if route_id in TROLLEY_ROUTES else "bus"
+            vehicles.append({
+                "id": entity_id_match.group(1),
+                "latitude": float(lat_match.group(1)),
+                "longitude": float(lon_match.group(1)),
+                "route_id": route_id,
+                "vehicle_type": vehicle_type,
+                "trolley_line": TROLLEY_LINES.get(route_id, "Trolley") if vehicle_type == "trolley" else None,
+                "vehicle_id": vehicle_id_match.group(1) if vehicle_id_match else None,
+                "timestamp": int(timestamp_match.group(1)) if timestamp_match else None,
+            })
+        except (ValueError, AttributeError):
+            continue
+    return vehicles
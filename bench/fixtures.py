@@ -0,0 +1,258 @@
+"""
+Fixtures for the benchmarks: synthetic SDMTS vehicle feeds (text and binary),
+the recorded NWS responses under cache/, raw gridpoint data derived from them,
+a placeholder map tile, and a synthetic GTFS static feed.
+"""
+import json
+import random
+import csv
+import io
+import struct
+import sys
+import zipfile
+import zlib
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+FIXTURE_DIR = REPO_DIR / "cache"
+
+# Make `app` importable when running the scripts from the repo root
+sys.path.insert(0, str(REPO_DIR / "backend"))
+
+ROUTES = ["1", "5", "7", "10", "12", "13", "215", "235", "510", "520", "530", "535"]
+
+
+def _synthetic_vehicles(n: int, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [
+        {
+            "id": str(1000 + i),
+            "trip_id": str(19000000 + i),
+            "route_id": rng.choice(ROUTES),
+            "latitude": round(32.55 + rng.random() * 0.5, 5),
+            "longitude": round(-117.30 + rng.random() * 0.4, 5),
+            "bearing": round(rng.random() * 360, 1),
+            "speed": round(rng.random() * 20, 1),
+            "timestamp": 1771373000 + rng.randrange(600),
+            "vehicle_id": str(2000 + i),
+        }
+        for i in range(n)
+    ]
+
+
+def make_pbtext_feed(n: int, seed: int = 1) -> str:
+    """A pbtext body shaped like the SDMTS feed, with n vehicles."""
+    out = ['header {\n  gtfs_realtime_version: "2.0"\n  incrementality: FULL_DATASET\n  timestamp: 1771373800\n}\n']
+    for v in _synthetic_vehicles(n, seed):
+        out.append(
+            f'entity {{\n'
+            f'  id: "{v["id"]}"\n'
+            f'  vehicle {{\n'
+            f'    trip {{\n'
+            f'      trip_id: "{v["trip_id"]}"\n'
+            f'      start_date: "20260218"\n'
+            f'      schedule_relationship: SCHEDULED\n'
+            f'      route_id: "{v["route_id"]}"\n'
+            f'      direction_id: 0\n'
+            f'    }}\n'
+            f'    position {{\n'
+            f'      latitude: {v["latitude"]}\n'
+            f'      longitude: {v["longitude"]}\n'
+            f'      bearing: {v["bearing"]}\n'
+            f'      speed: {v["speed"]}\n'
+            f'    }}\n'
+            f'    current_stop_sequence: 12\n'
+            f'    current_status: IN_TRANSIT_TO\n'
+            f'    timestamp: {v["timestamp"]}\n'
+            f'    stop_id: "75012"\n'
+            f'    vehicle {{\n'
+            f'      id: "{v["vehicle_id"]}"\n'
+            f'      label: "{v["vehicle_id"]}"\n'
+            f'    }}\n'
+            f'  }}\n'
+            f'}}\n'
+        )
+    return "".join(out)
+
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def _key(field: int, wire: int) -> bytes:
+    return _varint((field << 3) | wire)
+
+
+def _len(field: int, payload: bytes) -> bytes:
+    return _key(field, 2) + _varint(len(payload)) + payload
+
+
+def _str(field: int, text: str) -> bytes:
+    return _len(field, text.encode("utf-8"))
+
+
+def _f32(field: int, value: float) -> bytes:
+    return _key(field, 5) + struct.pack("<f", value)
+
+
+def make_protobuf_feed(n: int, seed: int = 1) -> bytes:
+    """The same vehicles as make_pbtext_feed, as a binary GTFS-RT FeedMessage."""
+    parts = [_len(1, _str(1, "2.0") + _key(2, 0) + _varint(0) + _key(3, 0) + _varint(1771373800))]
+    for v in _synthetic_vehicles(n, seed):
+        trip = _str(1, v["trip_id"]) + _str(3, "20260218") + _key(4, 0) + _varint(0) + _str(5, v["route_id"]) + _key(6, 0) + _varint(0)
+        position = _f32(1, v["latitude"]) + _f32(2, v["longitude"]) + _f32(3, v["bearing"]) + _f32(5, v["speed"])
+        descriptor = _str(1, v["vehicle_id"]) + _str(2, v["vehicle_id"])
+        vehicle = (
+            _len(1, trip) + _len(2, position) + _key(3, 0) + _varint(12) + _key(4, 0) + _varint(2)
+            + _key(5, 0) + _varint(v["timestamp"]) + _str(7, "75012") + _len(8, descriptor)
+        )
+        parts.append(_len(2, _str(1, v["id"]) + _len(4, vehicle)))
+    return b"".join(parts)
+
+
+def recorded_nws() -> Dict[str, Tuple[float, Any]]:
+    """cache/*.json fixtures as {cache key: (recorded timestamp, raw NWS JSON)}."""
+    out = {}
+    for p in sorted(FIXTURE_DIR.glob("nws_*.json")):
+        entry = json.loads(p.read_text(encoding="utf-8"))
+        out[p.stem] = (entry["_ts"], entry["data"])
+    return out
+
+
+# Sky cover implied by the NWS wording, for rebuilding the skyCover layer
+_SKY = (("mostly cloudy", 75), ("partly", 50), ("mostly", 25), ("cloudy", 95), ("overcast", 95), ("fog", 90))
+
+
+def _utc(text: str) -> datetime:
+    return datetime.fromisoformat(text).astimezone(timezone.utc)
+
+
+def _layer(uom: str, samples: List[Tuple[datetime, int, Any]]) -> Dict[str, Any]:
+    """(start, hours, value) samples -> an NWS layer, merging equal consecutive values into one run."""
+    runs: List[List[Any]] = []
+    for start, hours, value in samples:
+        if runs and runs[-1][2] == value and runs[-1][0] + timedelta(hours=runs[-1][1]) == start:
+            runs[-1][1] += hours
+        else:
+            runs.append([start, hours, value])
+    return {
+        "uom": uom,
+        "values": [{"validTime": f"{start.isoformat()}/PT{hours}H", "value": value} for start, hours, value in runs],
+    }
+
+
+def make_gridpoint(hourly: Dict[str, Any], forecast: Dict[str, Any]) -> Dict[str, Any]:
+    """A raw /gridpoints response carrying the same forecast as a recorded hourly + forecast pair."""
+    hours = hourly["properties"]["periods"]
+    starts = [_utc(p["startTime"]) for p in hours]
+
+    def hourly_layer(uom: str, value) -> Dict[str, Any]:
+        return _layer(uom, [(t, 1, value(p)) for t, p in zip(starts, hours)])
+
+    def sky(p: Dict[str, Any]) -> int:
+        text = p.get("shortForecast", "").lower()
+        return next((pct for word, pct in _SKY if word in text), 5)
+
+    def weather(p: Dict[str, Any]) -> List[Dict[str, Any]]:
+        text = p.get("shortForecast", "").lower()
+        kind = next((k for word, k in (("thunder", "thunderstorms"), ("shower", "rain_showers"), ("drizzle", "drizzle"), ("rain", "rain"), ("fog", "fog")) if word in text), None)
+        coverage = "likely" if "likely" in text else "slight_chance" if "slight" in text else "chance" if "chance" in text else None
+        return [{"coverage": coverage, "weather": kind, "intensity": None, "visibility": {"unitCode": "wmoUnit:km", "value": None}, "attributes": []}]
+
+    def extremes(day: bool) -> Dict[str, Any]:
+        samples = []
+        for p in forecast["properties"]["periods"]:
+            if p["isDaytime"] == day:
+                start, end = _utc(p["startTime"]), _utc(p["endTime"])
+                samples.append((start, int((end - start).total_seconds()) // 3600, round((p["temperature"] - 32) * 5 / 9, 2)))
+        return _layer("wmoUnit:degC", samples)
+
+    span = int((starts[-1] - starts[0]).total_seconds()) // 3600 + 1
+    return {
+        "type": "Feature",
+        "properties": {
+            "updateTime": hourly["properties"].get("updateTime"),
+            "validTimes": f"{starts[0].isoformat()}/P{span // 24}DT{span % 24}H",
+            "temperature": hourly_layer("wmoUnit:degC", lambda p: round((p["temperature"] - 32) * 5 / 9, 2)),
+            "apparentTemperature": hourly_layer("wmoUnit:degC", lambda p: round((p["temperature"] - 32) * 5 / 9, 2)),
+            "maxTemperature": extremes(True),
+            "minTemperature": extremes(False),
+            "relativeHumidity": hourly_layer("wmoUnit:percent", lambda p: (p.get("relativeHumidity") or {}).get("value")),
+            "probabilityOfPrecipitation": hourly_layer("wmoUnit:percent", lambda p: (p.get("probabilityOfPrecipitation") or {}).get("value")),
+            "skyCover": hourly_layer("wmoUnit:percent", sky),
+            "windSpeed": hourly_layer("wmoUnit:km_h-1", lambda p: round(int(p["windSpeed"].split()[-2]) * 1.609344, 2)),
+            "windGust": hourly_layer("wmoUnit:km_h-1", lambda p: None),
+            "weather": hourly_layer("", weather),
+        },
+    }
+
+
+def recorded_gridpoints() -> Dict[str, Any]:
+    """Raw gridpoint responses for every grid with recorded hourly and forecast fixtures, by cache key."""
+    recorded = recorded_nws()
+    out = {}
+    for key, (_, hourly) in recorded.items():
+        if key.startswith("nws_hourly_"):
+            grid = key[len("nws_hourly_"):]
+            forecast = recorded.get(f"nws_forecast_{grid}")
+            if forecast:
+                out[f"nws_gridpoint_{grid}"] = make_gridpoint(hourly, forecast[1])
+    return out
+
+
+def make_tile_png(size: int = 256, rgb: Tuple[int, int, int] = (232, 228, 218)) -> bytes:
+    """A solid-colour PNG map tile."""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    scanlines = (b"\x00" + bytes(rgb) * size) * size
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(scanlines, 9))
+        + chunk(b"IEND", b"")
+    )
+
+
+# Trolley lines in the synthetic GTFS feed: route_id -> (long name, color)
+GTFS_TROLLEYS = {"510": ("Blue Line", "0F4B8B"), "520": ("Orange Line", "E28112"), "530": ("Green Line", "15853B"), "540": ("Copper Line", "5F2E0B")}
+
+
+def _csv(rows: List[List[Any]]) -> str:
+    out = io.StringIO()
+    csv.writer(out, lineterminator="\n").writerows(rows)
+    return out.getvalue()
+
+
+def make_gtfs_zip(path: Path, stops: int = 4000, trips_per_route: int = 500, seed: int = 1) -> Path:
+    """A GTFS static zip for ROUTES: stops spread over the vehicle area and trip ids matching the feeds."""
+    rng = random.Random(seed)
+    routes = [["route_id", "route_short_name", "route_long_name", "route_type", "route_color"]]
+    for route_id in ROUTES:
+        name, color = GTFS_TROLLEYS.get(route_id, (f"Route {route_id}", "D52B1E"))
+        routes.append([route_id, route_id, name, 0 if route_id in GTFS_TROLLEYS else 3, color])
+    stop_rows = [["stop_id", "stop_name", "stop_lat", "stop_lon", "location_type"]]
+    for i in range(stops):
+        stop_rows.append([str(10000 + i), f"Stop {i}", round(32.55 + rng.random() * 0.5, 6), round(-117.30 + rng.random() * 0.4, 6), 0])
+    trips = [["route_id", "service_id", "trip_id"]]
+    trip_id = 19000000
+    for route_id in ROUTES:
+        for _ in range(trips_per_route):
+            trips.append([route_id, "WKDY", str(trip_id)])
+            trip_id += 1
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("routes.txt", _csv(routes))
+        z.writestr("stops.txt", _csv(stop_rows))
+        z.writestr("trips.txt", _csv(trips))
+        z.writestr("feed_info.txt", _csv([["feed_publisher_name", "feed_version"], ["bench", "synthetic"]]))
+    return path
@@ -0,0 +1,79 @@
+"""
+Concurrent load driver for a running backend.
+
+    python -m bench.load [--base http://127.0.0.1:8000] [--concurrency 50]
+                         [--duration 20] [--path /api/weather ...]
+
+Reports throughput, p50/p90/p99 latency and status counts per endpoint.
+Requests advertise gzip like a browser does; pass --revalidate to also send
+the ETag from the previous response, as a polling kiosk would.
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+from typing import Dict, List
+
+import httpx
+
+DEFAULT_PATHS = ["/api/weather", "/api/transit/vehicles"]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def worker(client: httpx.AsyncClient, path: str, deadline: float, revalidate: bool,
+                 latencies: List[float], statuses: Counter) -> None:
+    etag = None
+    while time.perf_counter() < deadline:
+        headers = {"If-None-Match": etag} if revalidate and etag else {}
+        start = time.perf_counter()
+        try:
+            response = await client.get(path, headers=headers)
+            await response.aread()
+        except httpx.HTTPError as e:
+            statuses[type(e).__name__] += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status_code] += 1
+        etag = response.headers.get("etag", etag)
+
+
+async def run(base: str, paths: List[str], concurrency: int, duration: float, revalidate: bool) -> None:
+    latencies: Dict[str, List[float]] = {p: [] for p in paths}
+    statuses: Dict[str, Counter] = {p: Counter() for p in paths}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=30, headers={"Accept-Encoding": "gzip"}) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(
+            worker(client, paths[i % len(paths)], deadline, revalidate, latencies[paths[i % len(paths)]], statuses[paths[i % len(paths)]])
+            for i in range(concurrency)
+        ))
+
+    print(f"{'endpoint':<28} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8}  statuses")
+    for path in paths:
+        samples = latencies[path]
+        print(
+            f"{path:<28} {len(samples) / duration:>8.1f} "
+            f"{percentile(samples, 50) * 1000:>8.1f} {percentile(samples, 90) * 1000:>8.1f} "
+            f"{percentile(samples, 99) * 1000:>8.1f}  {dict(statuses[path])}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds")
+    parser.add_argument("--path", action="append", dest="paths", help="endpoint to load (repeatable)")
+    parser.add_argument("--revalidate", action="store_true", help="send If-None-Match from the previous response")
+    args = parser.parse_args()
+    asyncio.run(run(args.base, args.paths or DEFAULT_PATHS, args.concurrency, args.duration, args.revalidate))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Micro-benchmarks for the hot paths.
+
+    python -m bench.micro [--repeat 5]
+
+Run from the repository root. Prints best-of-N timings per call; nothing
+touches the network.
+"""
+import argparse
+import asyncio
+import json
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from bench import baseline
+from bench.fixtures import FIXTURE_DIR, make_gtfs_zip, make_pbtext_feed, make_protobuf_feed, recorded_gridpoints, recorded_nws
+
+from app.providers import gtfs_static, nws_gridpoints, transit_sdmts, weather_nws
+
+FEED_SIZES = (100, 500, 1000, 5000)
+
+
+def best_of(fn: Callable[[], object], repeat: int, number: int = 1) -> float:
+    """Best wall time per call, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def report(name: str, seconds: float, extra: str = "") -> None:
+    print(f"{name:<44} {seconds * 1000:>10.3f} ms  {extra}")
+
+
+def bench_transit(repeat: int) -> None:
+    for n in FEED_SIZES:
+        text = make_pbtext_feed(n)
+        binary = make_protobuf_feed(n)
+        # The pre-optimisation text parser, as the number to beat
+        report(f"baseline parse_pbtext_response[{n}]", best_of(lambda: baseline.parse_pbtext_response(text), repeat), f"{len(text) / 1024:.0f} KiB")
+        report(f"parse_pbtext_response[{n}]", best_of(lambda: transit_sdmts.parse_pbtext_response(text), repeat), f"{len(text) / 1024:.0f} KiB")
+        report(f"parse_feed_message[{n}]", best_of(lambda: transit_sdmts.parse_feed_message(binary), repeat), f"{len(binary) / 1024:.0f} KiB")
+
+    # Static GTFS enrichment: loading the index, then parsing with route and stop lookups
+    scratch = Path(tempfile.mkdtemp(prefix="peter-bench-"))
+    try:
+        gtfs_static.INDEX_PATH = scratch / "gtfs_index.sqlite3"
+        start = time.perf_counter()
+        counts = gtfs_static.ingest(make_gtfs_zip(scratch / "gtfs.zip"), gtfs_static.INDEX_PATH)
+        report("gtfs_static.ingest", time.perf_counter() - start, f"{counts['stops']} stops, {counts['trips']} trips")
+        report("gtfs_static.StaticIndex (load)", best_of(lambda: gtfs_static.StaticIndex(gtfs_static.INDEX_PATH).close(), repeat))
+        gtfs_static.refresh()
+        binary = make_protobuf_feed(1000)
+        report("parse_feed_message[1000] + GTFS (cold)", best_of(lambda: (gtfs_static._index._nearest.clear(), transit_sdmts.parse_feed_message(binary)), repeat))
+        report("parse_feed_message[1000] + GTFS (memo)", best_of(lambda: transit_sdmts.parse_feed_message(binary), repeat))
+    finally:
+        gtfs_static.current().close()
+        gtfs_static._index = None
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def bench_weather(repeat: int) -> None:
+    fixtures = recorded_nws()
+    forecasts = [weather_nws._project_forecast(data) for key, (_, data) in fixtures.items() if key.startswith("nws_forecast_")]
+    periods = [weather_nws._periods_from_rows(f) for f in forecasts]
+    report("_build_week_from_forecast", best_of(lambda: [weather_nws._build_week_from_forecast(p) for p in periods], repeat, 100) / len(periods))
+
+    # Raw gridpoint mode: expanding the layers, then deriving both period lists from them
+    raw = list(recorded_gridpoints().values())
+    report("nws_gridpoints.project", best_of(lambda: [nws_gridpoints.project(g) for g in raw], repeat, 10) / len(raw))
+    grids = [nws_gridpoints.project(g) for g in raw]
+
+    def derive() -> None:
+        for g in grids:
+            nws_gridpoints.forecast_periods(g, "America/Los_Angeles", g["start"])
+            nws_gridpoints.hourly_rows(g, "America/Los_Angeles", g["start"])
+
+    report("nws_gridpoints periods + hourly rows", best_of(derive, repeat, 10) / len(grids))
+
+    # Payload building against a scratch copy of the recorded cache, with the clock frozen
+    # at recording time so every tier is fresh and nothing is fetched.
+    scratch = Path(tempfile.mkdtemp(prefix="peter-bench-"))
+    try:
+        for p in FIXTURE_DIR.glob("nws_*.json"):
+            shutil.copy(p, scratch)
+        weather_nws.CACHE_DIR = scratch
+        recorded_at = max(ts for ts, _ in fixtures.values())
+        weather_nws._now = lambda: recorded_at + 1
+        city = weather_nws.CITIES[0]
+
+        async def city_weather() -> None:
+            await weather_nws.get_weather_payload([city])
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(city_weather())     # first read migrates legacy entries
+            report("get_weather_payload (all cities, warm)", best_of(lambda: loop.run_until_complete(weather_nws.get_weather_payload()), repeat, 50))
+            report("get_weather_payload (primary, warm)", best_of(lambda: loop.run_until_complete(city_weather()), repeat, 50))
+            store = weather_nws._get_store()
+            report(f"get_weather_payload (primary, {weather_nws.CACHE_BACKEND} read)", best_of(lambda: (store.forget(), loop.run_until_complete(city_weather())), repeat, 20))
+            # Only the primary city has been read so far; migrate the other hourly entries too
+            hourly = [weather_nws._read_projected(k, weather_nws._project_hourly) for k in fixtures if k.startswith("nws_hourly_")]
+            size = sum(len(json.dumps(e, separators=(",", ":"))) for e in hourly) / len(hourly)
+            print(f"{'hourly cache entry size (projected)':<44} {size / 1024:>10.1f} KiB")
+        finally:
+            loop.close()
+            weather_nws._get_store().close()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark; the best is reported")
+    args = parser.parse_args()
+    bench_transit(args.repeat)
+    bench_weather(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Local stand-in for api.weather.gov, the SDMTS realtime feed and the map tile server.
+
+    python -m bench.standin [--port 8100] [--latency 0.15] [--jitter 0.05]
+                            [--fail-rate 0.0] [--vehicles 1000]
+
+Replays the recorded NWS responses under cache/ (plus raw /gridpoints data
+derived from them, for NWS_GRID_MODE=raw), a synthetic vehicle feed and
+placeholder map tiles, with configurable latency and failure injection. Responses carry ETag and
+Cache-Control so conditional revalidation (304) is exercised too. Point the
+backend at it with NWS_BASE_URL=http://127.0.0.1:<port>/nws and
+SDMTS_API_BASE=http://127.0.0.1:<port>/sdmts/MTS (and, for tiles,
+MAP_TILE_URL=http://127.0.0.1:<port>/tiles/{z}/{x}/{y}.png).
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+from bench.fixtures import make_pbtext_feed, make_protobuf_feed, make_tile_png, recorded_gridpoints, recorded_nws
+
+_POINTS = re.compile(r"^/nws/points/(-?[\d.]+),(-?[\d.]+)$")
+_GRIDPOINTS = re.compile(r"^/nws/gridpoints/(\w+)/(\d+),(\d+)(/forecast|/forecast/hourly)?$")
+_SDMTS = re.compile(r"^/sdmts/\w+\.(pb|pbtext)$")
+_TILES = re.compile(r"^/tiles/\d+/\d+/\d+\.png$")
+
+
+class Routes:
+    """Pre-encoded bodies keyed by request path."""
+
+    def __init__(self, vehicles: int) -> None:
+        self.bodies: Dict[str, Tuple[bytes, str, str]] = {}
+        for key, (_, data) in recorded_nws().items():
+            self.bodies[key] = self._entry(json.dumps(data).encode("utf-8"), "application/geo+json")
+        for key, data in recorded_gridpoints().items():
+            self.bodies[key] = self._entry(json.dumps(data).encode("utf-8"), "application/geo+json")
+        self.bodies["pbtext"] = self._entry(make_pbtext_feed(vehicles).encode("utf-8"), "text/plain")
+        self.bodies["pb"] = self._entry(make_protobuf_feed(vehicles), "application/x-protobuf")
+        self.bodies["tile"] = self._entry(make_tile_png(), "image/png")
+
+    @staticmethod
+    def _entry(body: bytes, content_type: str) -> Tuple[bytes, str, str]:
+        return body, content_type, '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+    def resolve(self, path: str) -> Optional[Tuple[bytes, str, str]]:
+        m = _POINTS.match(path)
+        if m:
+            return self.bodies.get(f"nws_points_{float(m[1]):.4f}_{float(m[2]):.4f}")
+        m = _GRIDPOINTS.match(path)
+        if m:
+            kind = "gridpoint" if not m[4] else "hourly" if m[4].endswith("hourly") else "forecast"
+            return self.bodies.get(f"nws_{kind}_{m[1]}_{m[2]}_{m[3]}")
+        m = _SDMTS.match(path)
+        if m:
+            return self.bodies[m[1]]
+        if _TILES.match(path):
+            return self.bodies["tile"]
+        return None
+
+
+def make_handler(routes: Routes, latency: float, jitter: float, fail_rate: float, max_age: int):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def _send(self, status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> None:
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if body:
+                self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            delay = latency + random.uniform(-jitter, jitter)
+            if delay > 0:
+                time.sleep(delay)
+            if random.random() < fail_rate:
+                self._send(503, b"injected failure", {"Content-Type": "text/plain"})
+                return
+
+            found = routes.resolve(self.path.split("?", 1)[0])
+            if found is None:
+                self._send(404, b"not found", {"Content-Type": "text/plain"})
+                return
+
+            body, content_type, etag = found
+            headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+            if self.headers.get("If-None-Match") == etag:
+                self._send(304, headers=headers)
+                return
+            headers["Content-Type"] = content_type
+            self._send(200, body, headers)
+
+    return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.15, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.05, help="+/- seconds of random latency")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--max-age", type=int, default=300, help="Cache-Control max-age sent upstream")
+    parser.add_argument("--vehicles", type=int, default=1000, help="vehicles in the synthetic SDMTS feed")
+    args = parser.parse_args()
+
+    routes = Routes(args.vehicles)
+    handler = make_handler(routes, args.latency, args.jitter, args.fail_rate, args.max_age)
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"stand-in listening on http://{args.host}:{args.port} ({len(routes.bodies)} routes)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
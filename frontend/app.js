@@ -262,31 +262,74 @@ function renderWeek(week) {
   }
 }
 
-async function loadWeather() {
+function applyWeather(data) {
   const status = document.getElementById("status-content");
-  try {
-    const res = await fetch("/api/weather", { cache: "no-store" });
-    const data = await res.json();
+  window.__weatherData = data;
 
-    window.__weatherData = data;
+  if (!data.primary) {
+    status.textContent = "Weather: no cities configured";
+    return;
+  }
 
-    if (!data.primary) {
-      status.textContent = "Weather: no cities configured";
-      return;
-    }
+  setUpdated(data.updated_at);
+  renderPrimary(data.primary);
+  renderOthers(data.others);
+  renderWeek(data.primary.week);
+  renderWarning(data.primary.rain_warning);
 
-    setUpdated(data.updated_at);
-    renderPrimary(data.primary);
-    renderOthers(data.others);
-    renderWeek(data.primary.week);
-    renderWarning(data.primary.rain_warning);
+  status.textContent = "OK";
+}
+
+// A kiosk picks its cities through its own URL (/?profile=office or /?cities=Name@lat,lon;...),
+// which is passed on to the weather API and the stream.
+const WEATHER_QUERY = (() => {
+  const page = new URLSearchParams(window.location.search);
+  const query = new URLSearchParams();
+  for (const name of ["cities", "profile"]) {
+    if (page.has(name)) query.set(name, page.get(name));
+  }
+  return query.toString();
+})();
 
-    status.textContent = "OK";
+async function loadWeather() {
+  const status = document.getElementById("status-content");
+  try {
+    const res = await fetch(`/api/weather${WEATHER_QUERY ? `?${WEATHER_QUERY}` : ""}`, { cache: "no-cache" });
+    if (!res.ok) throw new Error((await res.json()).detail || res.status);
+    applyWeather(await res.json());
   } catch (e) {
     status.textContent = `Weather error: ${e}`;
   }
 }
 
+// The server sends a heartbeat at least every 15s, so 45s of silence means the stream is down.
+const STREAM_SILENCE_MS = 45_000;
+let lastStreamEventAt = 0;
+
+function streamIsLive() {
+  return Date.now() - lastStreamEventAt < STREAM_SILENCE_MS;
+}
+
+function startStream() {
+  if (typeof EventSource === "undefined") return;
+
+  // EventSource reconnects by itself and resumes via Last-Event-ID;
+  // polling covers the gap until events flow again.
+  const source = new EventSource(`/api/stream?bbox=${TRANSIT_BBOX}${WEATHER_QUERY ? `&${WEATHER_QUERY}` : ""}`);
+  const touch = () => { lastStreamEventAt = Date.now(); };
+
+  source.addEventListener("weather", (event) => {
+    touch();
+    applyWeather(JSON.parse(event.data));
+  });
+  source.addEventListener("transit", (event) => {
+    touch();
+    renderTransitUpdate(JSON.parse(event.data));
+  });
+  source.addEventListener("heartbeat", touch);
+  source.onerror = () => { lastStreamEventAt = 0; };
+}
+
 // Keep your existing clock code if you like
 function setClock() {
   const el = document.getElementById("clock");
@@ -300,7 +343,10 @@ setClock();
 setInterval(setClock, 1000 * 10);
 
 loadWeather();
-setInterval(loadWeather, 1000 * 60 * 10);
+// Polling is the fallback; while the server push stream is alive it delivers updates instead.
+setInterval(() => {
+  if (!streamIsLive()) loadWeather();
+}, 1000 * 60 * 10);
 
 setInterval(() => {
   // refresh times without refetching weather
@@ -323,6 +369,7 @@ setInterval(() => {
 
 let transitMap = null;
 let vehicleMarkers = {};
+let transitVersion = null;  // snapshot version the markers reflect; null until the first full load
 let landmarkMarker = null;
 
 const TROLLEY_LINE_STYLES = {
@@ -333,11 +380,22 @@ const TROLLEY_LINE_STYLES = {
   Trolley: { className: "trolley-line-generic", color: "#888888" },
 };
 
+// Keep in sync with TRANSIT_BOUNDS in backend/app/providers/map_tiles.py (tile prefetch).
 const TRANSIT_BOUNDS = [
   [32.705, -117.22],
   [32.905, -116.99],
 ];
 
+// Only ask the backend for vehicles around the visible area (with a margin so
+// markers don't pop in right at the edge).
+const TRANSIT_BBOX_MARGIN = 0.02;
+const TRANSIT_BBOX = [
+  TRANSIT_BOUNDS[0][0] - TRANSIT_BBOX_MARGIN,
+  TRANSIT_BOUNDS[0][1] - TRANSIT_BBOX_MARGIN,
+  TRANSIT_BOUNDS[1][0] + TRANSIT_BBOX_MARGIN,
+  TRANSIT_BOUNDS[1][1] + TRANSIT_BBOX_MARGIN,
+].join(",");
+
 // Bus icon (blue circle)
 function getBusIcon() {
   if (typeof L === 'undefined') return null;
@@ -349,14 +407,16 @@ function getBusIcon() {
   });
 }
 
-function getTrolleyIcon(lineName) {
+// Lines without a style of their own take the route color from the GTFS feed, if any.
+function getTrolleyIcon(lineName, routeColor) {
   if (typeof L === 'undefined') return null;
   const style = TROLLEY_LINE_STYLES[lineName] || TROLLEY_LINE_STYLES.Trolley;
+  const dotStyle = !TROLLEY_LINE_STYLES[lineName] && routeColor ? ` style="background:${escapeHtml(routeColor)}"` : '';
   return L.divIcon({
     className: `transit-marker trolley-marker ${style.className}`,
     html: `
       <div class="marker-wrap">
-        <div class="marker-dot"></div>
+        <div class="marker-dot"${dotStyle}></div>
       </div>
     `,
     iconSize: [22, 22],
@@ -392,11 +452,10 @@ function initTransitMap() {
   transitMap.setMinZoom(11.4);
   transitMap.setMaxZoom(14.5);
 
-  // Use a reliable full-color basemap.
-  L.tileLayer('https://{s}.basemaps.cartocdn.com/rastertiles/voyager/{z}/{x}/{y}{r}.png', {
+  // CARTO's full-color basemap, through the backend's tile store so reloads
+  // cost no network and the map still draws offline.
+  L.tileLayer('/tiles/{z}/{x}/{y}.png', {
     maxZoom: 19,
-    subdomains: 'abcd',
-    crossOrigin: true,
   }).addTo(transitMap);
 
   transitMap.fitBounds(TRANSIT_BOUNDS, { padding: [8, 8] });
@@ -485,70 +544,124 @@ function initTransitMap() {
     .addTo(transitMap);
 }
 
-async function loadTransitVehicles() {
-  const subtitle = document.getElementById("transit-updated");
-  
-  if (!transitMap || typeof L === 'undefined') {
-    if (subtitle) subtitle.textContent = "Map not ready";
+function vehiclePopupHtml(vehicle) {
+  return `
+    <strong>${vehicle.vehicle_type === 'trolley' ? `${escapeHtml(vehicle.trolley_line || 'Trolley')} Line` : 'Bus'}</strong><br>
+    Route: ${escapeHtml(vehicle.route_name ? `${vehicle.route_id} – ${vehicle.route_name}` : vehicle.route_id)}<br>
+    ${vehicle.stop_name ? `Near: ${escapeHtml(vehicle.stop_name)}<br>` : ''}
+    Vehicle: ${vehicle.vehicle_id || 'N/A'}
+  `;
+}
+
+function upsertVehicleMarker(vehicle) {
+  const latLng = [vehicle.latitude, vehicle.longitude];
+  const iconKey = vehicle.vehicle_type === 'trolley'
+    ? `trolley:${vehicle.trolley_line || 'Trolley'}:${vehicle.route_color || ''}`
+    : 'bus';
+  const popupKey = `${iconKey}|${vehicle.route_id}|${vehicle.route_name}|${vehicle.stop_name}|${vehicle.vehicle_id}`;
+  const existing = vehicleMarkers[vehicle.id];
+
+  if (existing) {
+    // Only touch Leaflet for what actually changed.
+    const prev = existing.__vehicle;
+    if (prev.lat !== vehicle.latitude || prev.lon !== vehicle.longitude) {
+      existing.setLatLng(latLng);
+    }
+    if (prev.iconKey !== iconKey) {
+      existing.setIcon(vehicleIcon(vehicle));
+    }
+    if (prev.popupKey !== popupKey) {
+      existing.setPopupContent(vehiclePopupHtml(vehicle));
+    }
+    existing.__vehicle = { lat: vehicle.latitude, lon: vehicle.longitude, iconKey, popupKey };
     return;
   }
-  
-  try {
-    const res = await fetch("/api/transit/vehicles", { cache: "no-store" });
-    const data = await res.json();
-
-    if (!data.success) {
-      // Display error type and first part of message for diagnostic purposes
-      const errorMsg = data.error || "Unknown error";
-      const errorType = errorMsg.split(':')[0];
-      if (subtitle) subtitle.textContent = `Error: ${errorType}`;
-      return;
-    }
 
-    // Update timestamp
-    const now = new Date();
-    const hh = String(now.getHours()).padStart(2, "0");
-    const mm = String(now.getMinutes()).padStart(2, "0");
-    if (subtitle) subtitle.textContent = `Updated ${hh}:${mm} - ${data.count} vehicles`;
+  const marker = L.marker(latLng, { icon: vehicleIcon(vehicle) })
+    .bindPopup(vehiclePopupHtml(vehicle))
+    .addTo(transitMap);
+  marker.__vehicle = { lat: vehicle.latitude, lon: vehicle.longitude, iconKey, popupKey };
+  vehicleMarkers[vehicle.id] = marker;
+}
 
-    // Track current vehicle IDs
-    const currentVehicleIds = new Set();
+function removeVehicleMarker(id) {
+  const marker = vehicleMarkers[id];
+  if (!marker) return;
+  transitMap.removeLayer(marker);
+  delete vehicleMarkers[id];
+}
+
+function vehicleIcon(vehicle) {
+  return vehicle.vehicle_type === 'trolley'
+    ? getTrolleyIcon(vehicle.trolley_line || 'Trolley', vehicle.route_color)
+    : getBusIcon();
+}
 
-    // Update or add markers
+// Apply a /api/transit/vehicles response: either a full list or a delta since transitVersion.
+function applyTransitData(data) {
+  if (data.full) {
+    const currentVehicleIds = new Set();
     for (const vehicle of data.vehicles) {
       currentVehicleIds.add(vehicle.id);
-
-      const icon = vehicle.vehicle_type === 'trolley'
-        ? getTrolleyIcon(vehicle.trolley_line || 'Trolley')
-        : getBusIcon();
-      const latLng = [vehicle.latitude, vehicle.longitude];
-
-      if (vehicleMarkers[vehicle.id]) {
-        // Update existing marker
-        vehicleMarkers[vehicle.id].setIcon(icon);
-        vehicleMarkers[vehicle.id].setLatLng(latLng);
-      } else {
-        // Create new marker
-        const marker = L.marker(latLng, { icon })
-          .bindPopup(`
-            <strong>${vehicle.vehicle_type === 'trolley' ? `${escapeHtml(vehicle.trolley_line || 'Trolley')} Line` : 'Bus'}</strong><br>
-            Route: ${vehicle.route_id}<br>
-            Vehicle: ${vehicle.vehicle_id || 'N/A'}
-          `)
-          .addTo(transitMap);
-        
-        vehicleMarkers[vehicle.id] = marker;
-      }
+      upsertVehicleMarker(vehicle);
     }
-
     // Remove markers for vehicles no longer in the feed
     for (const id in vehicleMarkers) {
-      if (!currentVehicleIds.has(id)) {
-        transitMap.removeLayer(vehicleMarkers[id]);
-        delete vehicleMarkers[id];
-      }
+      if (!currentVehicleIds.has(id)) removeVehicleMarker(id);
     }
+  } else {
+    for (const vehicle of data.upserts) upsertVehicleMarker(vehicle);
+    for (const id of data.removed) removeVehicleMarker(id);
+  }
+  transitVersion = data.version;
+}
+
+function renderTransitUpdate(data) {
+  const subtitle = document.getElementById("transit-updated");
 
+  if (!transitMap || typeof L === 'undefined') {
+    if (subtitle) subtitle.textContent = "Map not ready";
+    return;
+  }
+
+  if (!data.success) {
+    // Display error type and first part of message for diagnostic purposes
+    const errorMsg = data.error || "Unknown error";
+    const errorType = errorMsg.split(':')[0];
+    if (subtitle) subtitle.textContent = `Error: ${errorType}`;
+    return;
+  }
+
+  // A delta only applies on top of the version it was computed from.
+  if (!data.full && data.since !== transitVersion) {
+    loadTransitVehicles(true);
+    return;
+  }
+
+  // Update timestamp (from the backend's last successful poll)
+  const updated = data.updated_at ? new Date(data.updated_at * 1000) : new Date();
+  const hh = String(updated.getHours()).padStart(2, "0");
+  const mm = String(updated.getMinutes()).padStart(2, "0");
+  const staleNote = data.stale ? " (stale)" : "";
+  if (subtitle) subtitle.textContent = `Updated ${hh}:${mm} - ${data.count} vehicles${staleNote}`;
+
+  applyTransitData(data);
+}
+
+async function loadTransitVehicles(full = false) {
+  const subtitle = document.getElementById("transit-updated");
+
+  if (!transitMap || typeof L === 'undefined') {
+    if (subtitle) subtitle.textContent = "Map not ready";
+    return;
+  }
+
+  try {
+    const url = (full || transitVersion === null)
+      ? `/api/transit/vehicles?bbox=${TRANSIT_BBOX}`
+      : `/api/transit/vehicles?bbox=${TRANSIT_BBOX}&since=${transitVersion}`;
+    const res = await fetch(url, { cache: "no-cache" });
+    renderTransitUpdate(await res.json());
   } catch (e) {
     if (subtitle) subtitle.textContent = `Transit error: ${e.message || e}`;
   }
@@ -569,5 +682,13 @@ if (document.readyState === 'loading') {
   }
 }
 
-// Update transit vehicles every 15 seconds
-setInterval(loadTransitVehicles, 1000 * 15);
+// Fallback: poll transit vehicles every 15 seconds while the push stream is down
+setInterval(() => {
+  if (!streamIsLive()) loadTransitVehicles();
+}, 1000 * 15);
+
+// =========================
+// Server push (SSE)
+// =========================
+
+startStream();
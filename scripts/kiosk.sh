@@ -2,6 +2,9 @@
 set -euo pipefail
 
 URL="http://localhost:8000"
+# Keep Chromium's disk cache so hashed /static assets survive kiosk restarts.
+CACHE_DIR="${XDG_CACHE_HOME:-$HOME/.cache}/peter-kiosk"
+mkdir -p "$CACHE_DIR"
 
 # Must run inside the graphical session (Wayland/X11).
 # If you run from SSH, these env vars are usually missing.
@@ -27,5 +30,5 @@ exec chromium-browser \
   --disable-features=TranslateUI \
   --autoplay-policy=no-user-gesture-required \
   --check-for-update-interval=31536000 \
-  --disk-cache-dir=/dev/null \
+  --disk-cache-dir="$CACHE_DIR" \
   "$URL"